@@ -8,21 +8,34 @@ AES (Advance Encryption Standard) implementation.
 
 # Reference: https://nvlpubs.nist.gov/nistpubs/FIPS/NIST.FIPS.197.pdf
 
+from Utility import key_schedule_cache
+
+try:
+    import numpy as np  # optional, accelerates `encrypt_blocks` / `decrypt_blocks`
+except ImportError:
+    np = None
+
 
 class AES(object):
-    def __init__(self, key):
+    def __init__(self, key, engine=None):
         """
         Return a AES object for encryption or decryption
 
         :param key: 128-bit/196-bit/256-bit key bytes
-        :raise AssertionError: if the type or length of key is invalid
+        :param str engine: round engine, "table"(32-bit T-tables) or "reference"(byte-wise layers),
+                           defaults to `AES.default_engine`
+        :raise AssertionError: if the type or length of key is invalid, or the engine is unknown
         """
         assert isinstance(key, (bytes, bytearray)), f"type of key must be bytes or bytearray, not {type(key)}"
         assert len(key) == 16 or len(key) == 24 or len(key) == 32, f"key length must be 16, 24, or 32, not {len(key)}"
+        engine = AES.default_engine if engine is None else engine
+        assert engine in AES.engines, f"engine must be one of {AES.engines}, not {engine!r}"
         self.key = key
+        self.engine = engine
 
         self.rounds = AES.number_of_rounds[len(key)]
-        self.subkeys = AES.key_expansion(self.key, self.rounds)
+        # all the round keys, derived once per key, see `Utility.KeyScheduleCache`
+        self.subkeys, self._ek, self._rks, self._dk = key_schedule_cache.get("AES", key, lambda: AES._schedule(key, self.rounds))
 
     # encryption & decryption function
     def encrypt(self, msg):
@@ -34,28 +47,24 @@ class AES(object):
         :rtype: bytes
         """
         assert len(msg) == 16, f"block size is 16, input length is {len(msg)}"
+        if self.engine == "table":
+            return self._encrypt_table(msg)
 
         # start
-        r = 0
-        k_sch = self.subkeys[0] + self.subkeys[1] + self.subkeys[2] + self.subkeys[3]
-
         state = list(msg)
-        AES.add_round_key(state, k_sch)
+        AES.add_round_key(state, self._rks[0])
 
         # round 1 ~ `rounds`-1
         for r in range(1, self.rounds):
             AES.sub_bytes(state)
             AES.shift_rows(state)
             AES.mix_columns(state)
-            k_sch = self.subkeys[4*r] + self.subkeys[4*r+1] + self.subkeys[4*r+2] + self.subkeys[4*r+3]
-            AES.add_round_key(state, k_sch)
+            AES.add_round_key(state, self._rks[r])
 
         # the last round
-        r = self.rounds
         AES.sub_bytes(state)
         AES.shift_rows(state)
-        k_sch = self.subkeys[-4] + self.subkeys[-3] + self.subkeys[-2] + self.subkeys[-1]
-        AES.add_round_key(state, k_sch)
+        AES.add_round_key(state, self._rks[-1])
 
         # convert `list` state to `bytes` output
         output = bytes(state)
@@ -70,34 +79,222 @@ class AES(object):
         :rtype: bytes
         """
         assert len(cipher) == 16, f"block size is 16, input length is {len(cipher)}"
+        if self.engine == "table":
+            return self._decrypt_table(cipher)
 
         # start
-        k_sch = self.subkeys[-4] + self.subkeys[-3] + self.subkeys[-2] + self.subkeys[-1]
-
         state = list(cipher)
-        AES.add_round_key(state, k_sch)
+        AES.add_round_key(state, self._rks[-1])
 
         # round 1 ~ `rounds`-1
         for r in range(1, self.rounds):
             AES.inv_shift_rows(state)
             AES.inv_sub_bytes(state)
-            k_sch = self.subkeys[-4*r-4] + self.subkeys[-4*r-3] + self.subkeys[-4*r-2] + self.subkeys[-4*r-1]
-            AES.add_round_key(state, k_sch)
+            AES.add_round_key(state, self._rks[-r-1])
             AES.inv_mix_columns(state)
 
         # the last round
-        r = self.rounds
         AES.inv_shift_rows(state)
         AES.inv_sub_bytes(state)
-        k_sch = self.subkeys[0] + self.subkeys[1] + self.subkeys[2] + self.subkeys[3]
-        AES.add_round_key(state, k_sch)
+        AES.add_round_key(state, self._rks[0])
 
         # convert `list` state to `bytes` output
         output = bytes(state)
         return output
 
+    def encrypt_blocks(self, buf):
+        """
+        Encryption of AES over many independent blocks(i.e. ECB without padding) in one call
+
+        :param bytes buf: bytes-like object of 16*n bytes
+        :return: 16*n bytes ciphertext
+        :rtype: bytearray
+        """
+        src = memoryview(buf).cast('B')
+        assert len(src) % 16 == 0, f"block size is 16, input length is {len(src)}"
+        if self.engine != "table":
+            return bytearray(b"".join([self.encrypt(src[i:i+16]) for i in range(0, len(src), 16)]))
+        if np is not None and len(src) >= 16*AES.numpy_threshold:
+            return self._crypt_blocks_numpy(src, True)
+
+        Te0, Te1, Te2, Te3 = AES.Te
+        Sbox = AES.Sbox
+        rk = self._ek
+        k0, k1, k2, k3 = rk[0:4]
+        f0, f1, f2, f3 = rk[-4:]
+        rounds = range(4, 4*self.rounds, 4)
+        out = bytearray(len(src))
+        for i in range(0, len(src), 16):
+            s = int.from_bytes(src[i:i+16], 'big')
+            s0 = (s >> 96) ^ k0
+            s1 = (s >> 64) & 0xFFFFFFFF ^ k1
+            s2 = (s >> 32) & 0xFFFFFFFF ^ k2
+            s3 = s & 0xFFFFFFFF ^ k3
+            for k in rounds:
+                s0, s1, s2, s3 = \
+                    Te0[s0 >> 24] ^ Te1[(s1 >> 16) & 0xFF] ^ Te2[(s2 >> 8) & 0xFF] ^ Te3[s3 & 0xFF] ^ rk[k], \
+                    Te0[s1 >> 24] ^ Te1[(s2 >> 16) & 0xFF] ^ Te2[(s3 >> 8) & 0xFF] ^ Te3[s0 & 0xFF] ^ rk[k+1], \
+                    Te0[s2 >> 24] ^ Te1[(s3 >> 16) & 0xFF] ^ Te2[(s0 >> 8) & 0xFF] ^ Te3[s1 & 0xFF] ^ rk[k+2], \
+                    Te0[s3 >> 24] ^ Te1[(s0 >> 16) & 0xFF] ^ Te2[(s1 >> 8) & 0xFF] ^ Te3[s2 & 0xFF] ^ rk[k+3]
+            out[i:i+16] = (
+                ((Sbox[s0 >> 24] << 24 | Sbox[(s1 >> 16) & 0xFF] << 16 | Sbox[(s2 >> 8) & 0xFF] << 8 | Sbox[s3 & 0xFF]) ^ f0) << 96 |
+                ((Sbox[s1 >> 24] << 24 | Sbox[(s2 >> 16) & 0xFF] << 16 | Sbox[(s3 >> 8) & 0xFF] << 8 | Sbox[s0 & 0xFF]) ^ f1) << 64 |
+                ((Sbox[s2 >> 24] << 24 | Sbox[(s3 >> 16) & 0xFF] << 16 | Sbox[(s0 >> 8) & 0xFF] << 8 | Sbox[s1 & 0xFF]) ^ f2) << 32 |
+                ((Sbox[s3 >> 24] << 24 | Sbox[(s0 >> 16) & 0xFF] << 16 | Sbox[(s1 >> 8) & 0xFF] << 8 | Sbox[s2 & 0xFF]) ^ f3)
+            ).to_bytes(16, 'big')
+        return out
+
+    def decrypt_blocks(self, buf):
+        """
+        Decryption of AES over many independent blocks(i.e. ECB without padding) in one call
+
+        :param bytes buf: bytes-like object of 16*n bytes
+        :return: 16*n bytes plaintext
+        :rtype: bytearray
+        """
+        src = memoryview(buf).cast('B')
+        assert len(src) % 16 == 0, f"block size is 16, input length is {len(src)}"
+        if self.engine != "table":
+            return bytearray(b"".join([self.decrypt(src[i:i+16]) for i in range(0, len(src), 16)]))
+        if np is not None and len(src) >= 16*AES.numpy_threshold:
+            return self._crypt_blocks_numpy(src, False)
+
+        Td0, Td1, Td2, Td3 = AES.Td
+        inv_Sbox = AES.inv_Sbox
+        rk = self._dk
+        k0, k1, k2, k3 = rk[0:4]
+        f0, f1, f2, f3 = rk[-4:]
+        rounds = range(4, 4*self.rounds, 4)
+        out = bytearray(len(src))
+        for i in range(0, len(src), 16):
+            s = int.from_bytes(src[i:i+16], 'big')
+            s0 = (s >> 96) ^ k0
+            s1 = (s >> 64) & 0xFFFFFFFF ^ k1
+            s2 = (s >> 32) & 0xFFFFFFFF ^ k2
+            s3 = s & 0xFFFFFFFF ^ k3
+            for k in rounds:
+                s0, s1, s2, s3 = \
+                    Td0[s0 >> 24] ^ Td1[(s3 >> 16) & 0xFF] ^ Td2[(s2 >> 8) & 0xFF] ^ Td3[s1 & 0xFF] ^ rk[k], \
+                    Td0[s1 >> 24] ^ Td1[(s0 >> 16) & 0xFF] ^ Td2[(s3 >> 8) & 0xFF] ^ Td3[s2 & 0xFF] ^ rk[k+1], \
+                    Td0[s2 >> 24] ^ Td1[(s1 >> 16) & 0xFF] ^ Td2[(s0 >> 8) & 0xFF] ^ Td3[s3 & 0xFF] ^ rk[k+2], \
+                    Td0[s3 >> 24] ^ Td1[(s2 >> 16) & 0xFF] ^ Td2[(s1 >> 8) & 0xFF] ^ Td3[s0 & 0xFF] ^ rk[k+3]
+            out[i:i+16] = (
+                ((inv_Sbox[s0 >> 24] << 24 | inv_Sbox[(s3 >> 16) & 0xFF] << 16 | inv_Sbox[(s2 >> 8) & 0xFF] << 8 | inv_Sbox[s1 & 0xFF]) ^ f0) << 96 |
+                ((inv_Sbox[s1 >> 24] << 24 | inv_Sbox[(s0 >> 16) & 0xFF] << 16 | inv_Sbox[(s3 >> 8) & 0xFF] << 8 | inv_Sbox[s2 & 0xFF]) ^ f1) << 64 |
+                ((inv_Sbox[s2 >> 24] << 24 | inv_Sbox[(s1 >> 16) & 0xFF] << 16 | inv_Sbox[(s0 >> 8) & 0xFF] << 8 | inv_Sbox[s3 & 0xFF]) ^ f2) << 32 |
+                ((inv_Sbox[s3 >> 24] << 24 | inv_Sbox[(s2 >> 16) & 0xFF] << 16 | inv_Sbox[(s1 >> 8) & 0xFF] << 8 | inv_Sbox[s0 & 0xFF]) ^ f3)
+            ).to_bytes(16, 'big')
+        return out
+
+    def _crypt_blocks_numpy(self, src, enc):
+        """
+        The table engine over NumPy uint32 arrays, one lane per block
+
+        :param memoryview src: 16*n bytes
+        :param bool enc: True for encryption, False for decryption
+        :return: 16*n bytes output
+        :rtype: bytearray
+        """
+        if enc:
+            T0, T1, T2, T3 = AES._np_Te
+            box, rk = AES._np_Sbox, self._ek
+            # column feeding row r of column c is column (c+r) % 4 for ShiftRows
+            shift = (1, 2, 3)
+        else:
+            T0, T1, T2, T3 = AES._np_Td
+            box, rk = AES._np_inv_Sbox, self._dk
+            # and (c-r) % 4 for InvShiftRows
+            shift = (3, 2, 1)
+        rk = np.array(rk, dtype=np.uint32)
+        s = np.frombuffer(src, dtype='>u4').reshape(-1, 4).astype(np.uint32) ^ rk[0:4]
+        s = [s[:, 0], s[:, 1], s[:, 2], s[:, 3]]
+        for k in range(4, 4*self.rounds, 4):
+            s = [
+                T0[s[c] >> 24] ^ T1[(s[(c+shift[0]) % 4] >> 16) & 0xFF] ^
+                T2[(s[(c+shift[1]) % 4] >> 8) & 0xFF] ^ T3[s[(c+shift[2]) % 4] & 0xFF] ^ rk[k+c]
+                for c in range(4)
+            ]
+        k = 4*self.rounds
+        s = [
+            (box[s[c] >> 24] << 24 | box[(s[(c+shift[0]) % 4] >> 16) & 0xFF] << 16 |
+             box[(s[(c+shift[1]) % 4] >> 8) & 0xFF] << 8 | box[s[(c+shift[2]) % 4] & 0xFF]) ^ rk[k+c]
+            for c in range(4)
+        ]
+        return bytearray(np.stack(s, axis=1).astype('>u4').tobytes())
+
+    def _encrypt_table(self, msg):
+        """
+        Encryption of AES over four 32-bit column words, each round being four T-table lookups per column
+
+        :param bytes msg: 128-bit bytes of plaintext
+        :return: 128-bit bytes ciphertext
+        :rtype: bytes
+        """
+        Te0, Te1, Te2, Te3 = AES.Te
+        Sbox = AES.Sbox
+        rk = self._ek
+
+        s0 = int.from_bytes(msg[0:4], 'big') ^ rk[0]
+        s1 = int.from_bytes(msg[4:8], 'big') ^ rk[1]
+        s2 = int.from_bytes(msg[8:12], 'big') ^ rk[2]
+        s3 = int.from_bytes(msg[12:16], 'big') ^ rk[3]
+
+        # round 1 ~ `rounds`-1: SubBytes, ShiftRows, MixColumns and AddRoundKey fused
+        for k in range(4, 4*self.rounds, 4):
+            s0, s1, s2, s3 = \
+                Te0[s0 >> 24] ^ Te1[(s1 >> 16) & 0xFF] ^ Te2[(s2 >> 8) & 0xFF] ^ Te3[s3 & 0xFF] ^ rk[k], \
+                Te0[s1 >> 24] ^ Te1[(s2 >> 16) & 0xFF] ^ Te2[(s3 >> 8) & 0xFF] ^ Te3[s0 & 0xFF] ^ rk[k+1], \
+                Te0[s2 >> 24] ^ Te1[(s3 >> 16) & 0xFF] ^ Te2[(s0 >> 8) & 0xFF] ^ Te3[s1 & 0xFF] ^ rk[k+2], \
+                Te0[s3 >> 24] ^ Te1[(s0 >> 16) & 0xFF] ^ Te2[(s1 >> 8) & 0xFF] ^ Te3[s2 & 0xFF] ^ rk[k+3]
+
+        # the last round (no MixColumns)
+        k = 4*self.rounds
+        t0 = (Sbox[s0 >> 24] << 24 | Sbox[(s1 >> 16) & 0xFF] << 16 | Sbox[(s2 >> 8) & 0xFF] << 8 | Sbox[s3 & 0xFF]) ^ rk[k]
+        t1 = (Sbox[s1 >> 24] << 24 | Sbox[(s2 >> 16) & 0xFF] << 16 | Sbox[(s3 >> 8) & 0xFF] << 8 | Sbox[s0 & 0xFF]) ^ rk[k+1]
+        t2 = (Sbox[s2 >> 24] << 24 | Sbox[(s3 >> 16) & 0xFF] << 16 | Sbox[(s0 >> 8) & 0xFF] << 8 | Sbox[s1 & 0xFF]) ^ rk[k+2]
+        t3 = (Sbox[s3 >> 24] << 24 | Sbox[(s0 >> 16) & 0xFF] << 16 | Sbox[(s1 >> 8) & 0xFF] << 8 | Sbox[s2 & 0xFF]) ^ rk[k+3]
+        return (t0 << 96 | t1 << 64 | t2 << 32 | t3).to_bytes(16, 'big')
+
+    def _decrypt_table(self, cipher):
+        """
+        Decryption of AES over four 32-bit column words, using the equivalent inverse cipher(fips-197 5.3.5)
+
+        :param bytes cipher: 128-bit bytes of ciphertext
+        :return: 128-bit bytes plaintext
+        :rtype: bytes
+        """
+        Td0, Td1, Td2, Td3 = AES.Td
+        inv_Sbox = AES.inv_Sbox
+        rk = self._dk
+
+        s0 = int.from_bytes(cipher[0:4], 'big') ^ rk[0]
+        s1 = int.from_bytes(cipher[4:8], 'big') ^ rk[1]
+        s2 = int.from_bytes(cipher[8:12], 'big') ^ rk[2]
+        s3 = int.from_bytes(cipher[12:16], 'big') ^ rk[3]
+
+        # round 1 ~ `rounds`-1: InvSubBytes, InvShiftRows, InvMixColumns and AddRoundKey fused
+        for k in range(4, 4*self.rounds, 4):
+            s0, s1, s2, s3 = \
+                Td0[s0 >> 24] ^ Td1[(s3 >> 16) & 0xFF] ^ Td2[(s2 >> 8) & 0xFF] ^ Td3[s1 & 0xFF] ^ rk[k], \
+                Td0[s1 >> 24] ^ Td1[(s0 >> 16) & 0xFF] ^ Td2[(s3 >> 8) & 0xFF] ^ Td3[s2 & 0xFF] ^ rk[k+1], \
+                Td0[s2 >> 24] ^ Td1[(s1 >> 16) & 0xFF] ^ Td2[(s0 >> 8) & 0xFF] ^ Td3[s3 & 0xFF] ^ rk[k+2], \
+                Td0[s3 >> 24] ^ Td1[(s2 >> 16) & 0xFF] ^ Td2[(s1 >> 8) & 0xFF] ^ Td3[s0 & 0xFF] ^ rk[k+3]
+
+        # the last round (no InvMixColumns)
+        k = 4*self.rounds
+        t0 = (inv_Sbox[s0 >> 24] << 24 | inv_Sbox[(s3 >> 16) & 0xFF] << 16 | inv_Sbox[(s2 >> 8) & 0xFF] << 8 | inv_Sbox[s1 & 0xFF]) ^ rk[k]
+        t1 = (inv_Sbox[s1 >> 24] << 24 | inv_Sbox[(s0 >> 16) & 0xFF] << 16 | inv_Sbox[(s3 >> 8) & 0xFF] << 8 | inv_Sbox[s2 & 0xFF]) ^ rk[k+1]
+        t2 = (inv_Sbox[s2 >> 24] << 24 | inv_Sbox[(s1 >> 16) & 0xFF] << 16 | inv_Sbox[(s0 >> 8) & 0xFF] << 8 | inv_Sbox[s3 & 0xFF]) ^ rk[k+2]
+        t3 = (inv_Sbox[s3 >> 24] << 24 | inv_Sbox[(s2 >> 16) & 0xFF] << 16 | inv_Sbox[(s1 >> 8) & 0xFF] << 8 | inv_Sbox[s0 & 0xFF]) ^ rk[k+3]
+        return (t0 << 96 | t1 << 64 | t2 << 32 | t3).to_bytes(16, 'big')
+
     # constant
+    block_size = 16
     number_of_rounds = {16: 10, 24: 12, 32: 14}
+    engines = ("table", "reference")
+    default_engine = "table"
+    # minimum number of blocks for `encrypt_blocks` / `decrypt_blocks` to use NumPy
+    numpy_threshold = 64
 
     # table
     Sbox = (
@@ -190,9 +387,7 @@ class AES(object):
         """
 
         # ref: https://github.com/bozhu/AES-Python/blob/master/aes.py
-        def xtime(a):
-            return (((a << 1) ^ 0x1B) & 0xFF) if (a & 0x80) else (a << 1)
-
+        xtime = AES.xtime
         for i in range(4):
             t = s[4*i] ^ s[4*i+1] ^ s[4*i+2] ^ s[4*i+3]
             u = s[4*i]
@@ -208,13 +403,28 @@ class AES(object):
 
         :param list s: 16-byte list of the state
         """
-        # fips-197 5.3.3
+        # fips-197 5.3.3, computed as MixColumns after a preprocessing step
+        # ({0e,0b,0d,09} = {02,01,01,03} * {05,00,04,00}, see The Design of Rijndael 4.1.3)
+        xtime = AES.xtime
         for i in range(4):
-            s[4*i], s[4*i+1], s[4*i+2], s[4*i+3] = \
-                AES.gmul(0x0e, s[4*i]) ^ AES.gmul(0x0b, s[4*i+1]) ^ AES.gmul(0x0d, s[4*i+2]) ^ AES.gmul(0x09, s[4*i+3]), \
-                AES.gmul(0x09, s[4*i]) ^ AES.gmul(0x0e, s[4*i+1]) ^ AES.gmul(0x0b, s[4*i+2]) ^ AES.gmul(0x0d, s[4*i+3]), \
-                AES.gmul(0x0d, s[4*i]) ^ AES.gmul(0x09, s[4*i+1]) ^ AES.gmul(0x0e, s[4*i+2]) ^ AES.gmul(0x0b, s[4*i+3]), \
-                AES.gmul(0x0b, s[4*i]) ^ AES.gmul(0x0d, s[4*i+1]) ^ AES.gmul(0x09, s[4*i+2]) ^ AES.gmul(0x0e, s[4*i+3])
+            u = xtime(xtime(s[4*i] ^ s[4*i+2]))
+            v = xtime(xtime(s[4*i+1] ^ s[4*i+3]))
+            s[4*i] ^= u
+            s[4*i+1] ^= v
+            s[4*i+2] ^= u
+            s[4*i+3] ^= v
+        AES.mix_columns(s)
+
+    @staticmethod
+    def xtime(a):
+        """
+        Multiplication by {02} in GF(2^8)
+
+        :param int a: operand
+        :return: {02}•a over GF(2^8)
+        :rtype: int
+        """
+        return (((a << 1) ^ 0x1B) & 0xFF) if (a & 0x80) else (a << 1)
 
     @staticmethod
     def add_round_key(s, k):
@@ -285,6 +495,59 @@ class AES(object):
             i += 1
         return subkeys
 
+    @staticmethod
+    def _schedule(k, r):
+        """
+        :param bytes k: the Cipher Key
+        :param int r: number of rounds
+        :return: subkeys(4-byte lists), the same round keys packed as 32-bit words for the table engine,
+                 16-byte round keys for the reference engine, round keys of the equivalent inverse cipher
+        :rtype: list
+        """
+        subkeys = AES.key_expansion(k, r)
+        ek = [int.from_bytes(bytes(w), 'big') for w in subkeys]
+        rks = [sum(subkeys[i:i+4], []) for i in range(0, len(subkeys), 4)]
+        return [subkeys, ek, rks, AES.inv_round_keys(ek, r)]
+
+    @staticmethod
+    def inv_round_keys(ek, r):
+        """
+        Derive the round keys of the equivalent inverse cipher(fips-197 5.3.5)
+
+        :param list ek: 4*(r+1) round key words(32-bit int) of the cipher
+        :param int r: number of rounds
+        :return: 4*(r+1) round key words in decryption order, InvMixColumns applied to round 1 ~ r-1
+        :rtype: list
+        """
+        Td0, Td1, Td2, Td3 = AES.Td
+        Sbox = AES.Sbox
+        dk = ek[4*r:4*r+4]
+        for i in range(4*(r-1), 0, -4):
+            for w in ek[i:i+4]:
+                # Td[Sbox[x]] is InvMixColumns of a single byte
+                dk.append(Td0[Sbox[w >> 24]] ^ Td1[Sbox[(w >> 16) & 0xFF]] ^ Td2[Sbox[(w >> 8) & 0xFF]] ^ Td3[Sbox[w & 0xFF]])
+        dk += ek[0:4]
+        return dk
+
+    @staticmethod
+    def gen_tables(box, coef):
+        """
+        Generate the four T-tables which combine a S-box with a column mixing
+
+        :param tuple box: 256-entry S-box
+        :param tuple coef: the column of the mixing matrix, e.g. (0x02, 0x01, 0x01, 0x03) for MixColumns
+        :return: four 256-entry tables of 32-bit words, each one rotated right by 8 bits from the previous
+        :rtype: tuple
+        """
+        t0 = tuple(
+            AES.gmul(coef[0], s) << 24 | AES.gmul(coef[1], s) << 16 | AES.gmul(coef[2], s) << 8 | AES.gmul(coef[3], s)
+            for s in box
+        )
+        t1 = tuple((w >> 8 | w << 24) & 0xFFFFFFFF for w in t0)
+        t2 = tuple((w >> 8 | w << 24) & 0xFFFFFFFF for w in t1)
+        t3 = tuple((w >> 8 | w << 24) & 0xFFFFFFFF for w in t2)
+        return t0, t1, t2, t3
+
     @staticmethod
     def gmul(a, b):
         """
@@ -308,4 +571,14 @@ class AES(object):
             if carry:
                 a ^= 0x11b  # sub 0b1_0001_1011, a.k.a. the irreducible polynomial x^8+x^4+x^3+x^1+1
             b >>= 1
-        return p
\ No newline at end of file
+        return p
+
+
+# T-tables, fips-197 5.2.1 & 5.3.5
+AES.Te = AES.gen_tables(AES.Sbox, (0x02, 0x01, 0x01, 0x03))
+AES.Td = AES.gen_tables(AES.inv_Sbox, (0x0e, 0x09, 0x0d, 0x0b))
+if np is not None:
+    AES._np_Te = tuple(np.array(t, dtype=np.uint32) for t in AES.Te)
+    AES._np_Td = tuple(np.array(t, dtype=np.uint32) for t in AES.Td)
+    AES._np_Sbox = np.array(AES.Sbox, dtype=np.uint32)
+    AES._np_inv_Sbox = np.array(AES.inv_Sbox, dtype=np.uint32)
@@ -3,21 +3,37 @@
 
 '''
 Modes of AES implementation.
+
+The modes work with any block cipher object that has `encrypt(block)` and
+`decrypt(block)` and a `block_size`(16 if absent), e.g. `SM4.SM4`,
+`DES.DES`, `DES.TripleDES` or `TEA.TEA`; `encrypt_blocks(buf)` and
+`decrypt_blocks(buf)` are used for whole runs of blocks when the cipher has them.
+GCM needs a 128-bit block cipher(AES or SM4).
 '''
 
-from AES import AES_enc, AES_dec
+from AES import AES
+from DES import TripleDES
+from SM4 import SM4
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hmac
+import mmap
 import os
+import sys
+import tempfile
 
-def padding(s, Mode="PKCS7"):
+def padding(s, Mode="PKCS7", block_size=16):
     '''
     Padding for AES
 
     :param bytes s: plaintext need to be padded
     :param str Mode: modes of padding, supporting "ZeorPadding", "PKCS7"(default), "ISO10126", "ANSIX923", "None"
+    :param int block_size: block size in bytes(default 16)
     :return: plaintext after padding
     :rtype: bytes
     '''
-    len_pad = 16 - len(s) % 16
+    len_pad = block_size - len(s) % block_size
     if Mode == "ZeroPadding":
         s += b'\x00' * len_pad
     elif Mode == "PKCS7":
@@ -31,246 +47,1242 @@ def padding(s, Mode="PKCS7"):
     else:
         raise ValueError("Wrong mode")
     # check for length
-    if len(s) % 16 != 0 and len(s) == 0:
-        raise ValueError("The length of plaintext must be the mutiple of 16")
+    if len(s) % block_size != 0:
+        raise ValueError(f"The length of plaintext must be the mutiple of {block_size}")
     return s
 
+def unpadding(s, Mode="PKCS7", block_size=16):
+    '''
+    Remove the padding added by `padding`
+
+    :param bytes s: padded plaintext
+    :param str Mode: modes of padding, supporting "ZeorPadding", "PKCS7"(default), "ISO10126", "ANSIX923", "None"
+    :param int block_size: block size in bytes(default 16)
+    :return: plaintext without padding
+    :rtype: bytes
+    :raise ValueError: if the padding is malformed
+    '''
+    if Mode == "None":
+        return s
+    if len(s) % block_size != 0 or len(s) == 0:
+        raise ValueError(f"The length of padded plaintext must be a positive mutiple of {block_size}")
+    if Mode == "ZeroPadding":
+        # ambiguous by design: trailing zeros of the plaintext are stripped too
+        return s.rstrip(b'\x00')
+    if Mode not in ("PKCS7", "ISO10126", "ANSIX923"):
+        raise ValueError("Wrong mode")
+    len_pad = s[-1]
+    if not 1 <= len_pad <= block_size:
+        raise ValueError("Invalid padding")
+    if Mode == "PKCS7" and s[-len_pad:] != bytes([len_pad]) * len_pad:
+        raise ValueError("Invalid padding")
+    if Mode == "ANSIX923" and s[-len_pad:-1] != b'\x00' * (len_pad-1):
+        raise ValueError("Invalid padding")
+    return s[:-len_pad]
+
+
+'''Mode contexts'''
+# A mode context is built once from an `AES` object, so the key schedule is
+# expanded only once however many blocks (or messages) go through it.
+#
+# Inputs are read through a `memoryview` and results are written into one
+# preallocated `bytearray` (or a caller-provided buffer `out`), so the cost is
+# linear in the message size; blocks are xored as (8*block_size)-bit integers.
+class _Mode(object):
+    # stream modes(CFB/OFB/CTR) need no padding and accept a partial last block
+    stream = False
+    # process pool settings of the modes that can run in parallel,
+    # inputs shorter than `parallel_threshold` bytes stay in this process
+    workers = 1
+    chunk_size = 1 << 16
+    parallel_threshold = 1 << 18
+    _pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Shut down the worker processes, if any were started
+        '''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def block_size(self):
+        '''
+        Block size of the cipher in bytes
+        '''
+        return getattr(self.cipher, 'block_size', 16)
+
+    def _parallel(self, n):
+        '''
+        Whether `n` bytes should be processed by the worker processes
+        '''
+        return self.workers > 1 and n >= self.parallel_threshold
+
+    def _map(self, fn, *iterables):
+        '''
+        `map` over the worker processes, each of which holds its own copy of the cipher;
+        the pool is started on first use and kept until `close()`.
+
+        The arguments are drawn lazily and at most two tasks per worker are in flight,
+        so only a few chunks of a large input are copied at any time. Results come
+        back in order.
+        '''
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.cipher,))
+        pending = deque()
+        try:
+            for args in zip(*iterables):
+                pending.append(self._pool.submit(fn, *args))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+    def _decrypt_chunks(self, task, src, dst, IV):
+        '''
+        Decrypt `src` into `dst` by the worker processes, chunked on block boundaries;
+        each task gets its chunk along with the ciphertext block preceding it
+
+        :param task: `task(prev, chunk)` returning the plaintext of `chunk`
+        :param memoryview src: ciphertext
+        :param memoryview dst: output view
+        :param bytes IV: the block preceding `src`
+        '''
+        step = self.chunk_size
+        offsets = range(0, len(src), step)
+        bs = self.block_size
+        # copied(for pickling) only when submitted
+        prevs = (bytes(src[i-bs:i]) if i else IV for i in offsets)
+        chunks = (bytes(src[i:i+step]) for i in offsets)
+        for i, pt in zip(offsets, self._map(task, prevs, chunks)):
+            dst[i:i+len(pt)] = pt
+
+    def _set_workers(self, workers, chunk_size, parallel_threshold):
+        '''
+        :param int workers: number of worker processes, None for `os.cpu_count()`
+        :param int chunk_size: bytes per task, rounded down to whole blocks
+        :param int parallel_threshold: minimum input length to go parallel
+        '''
+        self.workers = os.cpu_count() if workers is None else workers
+        bs = self.block_size
+        self.chunk_size = max(bs, chunk_size - chunk_size % bs)
+        self.parallel_threshold = parallel_threshold
+
+    def encrypt(self, pt, pad="PKCS7", out=None):
+        '''
+        :param bytes pt: plaintext(any bytes-like object)
+        :param str pad: mode of padding(default PKCS7)
+        :param bytearray out: writable buffer to write the ciphertext into(optional)
+        :return: ciphertext, or a memoryview of `out` holding it
+        :rtype: bytearray
+        '''
+        src = _view(pt)
+        bs = self.block_size
+        n = len(src) - len(src) % bs
+        if self.stream and pad == "None":
+            tail = src[n:]
+        else:
+            tail = memoryview(padding(bytes(src[n:]), pad, bs))
+        res, dst = _output(out, n + len(tail))
+        state = self._encrypt_into(src[:n], dst[:n], self._initial_state())
+        self._encrypt_into(tail, dst[n:], state)
+        return res
+
+    def decrypt(self, ct, out=None):
+        '''
+        :param bytes ct: ciphertext(any bytes-like object)
+        :param bytearray out: writable buffer to write the plaintext into(optional)
+        :return: plaintext(padded), or a memoryview of `out` holding it
+        :rtype: bytearray
+        '''
+        src = _view(ct)
+        if not self.stream and len(src) % self.block_size != 0:
+            raise ValueError(f"The length of ciphertext must be the mutiple of {self.block_size}")
+        res, dst = _output(out, len(src))
+        self._decrypt_into(src, dst, self._initial_state())
+        return res
+
+    def encryptor(self, pad="PKCS7"):
+        '''
+        Return an incremental encryption object, padding is applied in its `finalize()`
+
+        :param str pad: mode of padding(default PKCS7)
+        :rtype: StreamCipher
+        '''
+        return StreamCipher(self, True, pad)
+
+    def decryptor(self, pad="PKCS7"):
+        '''
+        Return an incremental decryption object, padding is stripped in its `finalize()`
+
+        :param str pad: mode of padding(default PKCS7), "None" to keep the plaintext as it is
+        :rtype: StreamCipher
+        '''
+        return StreamCipher(self, False, pad)
+
+    def _initial_state(self):
+        '''
+        Return the chaining state before the first block
+        '''
+        return None
+
+    def _encrypt_into(self, src, dst, state):
+        '''
+        Encrypt `src` into `dst` of the same length, starting from the chaining `state`
+
+        :param memoryview src: whole blocks, or a partial last block for stream modes
+        :param memoryview dst: output view
+        :param state: chaining state
+        :return: chaining state after the last block
+        '''
+        raise NotImplementedError
+
+    def _decrypt_into(self, src, dst, state):
+        '''
+        Decrypt `src` into `dst` of the same length, starting from the chaining `state`
+        '''
+        raise NotImplementedError
+
+
+class ECBMode(_Mode):
+    def __init__(self, cipher):
+        '''
+        Electronic Codebook Mode context
+
+        :param AES cipher: the block cipher
+        '''
+        self.cipher = cipher
+
+    def _encrypt_into(self, src, dst, state):
+        dst[:len(src)] = _encrypt_blocks(self.cipher, src)
+        return state
+
+    def _decrypt_into(self, src, dst, state):
+        dst[:len(src)] = _decrypt_blocks(self.cipher, src)
+        return state
+
+
+class CBCMode(_Mode):
+    def __init__(self, cipher, IV, workers=1, chunk_size=1 << 16, parallel_threshold=1 << 18):
+        '''
+        Cipher Block Chaining Mode context
+
+        Decryption is parallel: every plaintext block depends only on two ciphertext
+        blocks, so with `workers` > 1 long inputs are split on block boundaries(with
+        one block of overlap) and decrypted by a process pool, `chunk_size` bytes per task.
+
+        :param AES cipher: the block cipher
+        :param bytes IV: initialization vector
+        :param int workers: number of worker processes(default 1), None for `os.cpu_count()`
+        :param int chunk_size: bytes of ciphertext per task
+        :param int parallel_threshold: inputs shorter than it are decrypted in this process
+        '''
+        self.cipher = cipher
+        assert isinstance(IV, bytes) and len(IV)==self.block_size
+        self.IV = IV
+        self._set_workers(workers, chunk_size, parallel_threshold)
+
+    def _initial_state(self):
+        return int.from_bytes(self.IV, 'big')
+
+    def _encrypt_into(self, src, dst, yi):
+        enc = self.cipher.encrypt
+        bs = self.block_size
+        for i in range(0, len(src), bs):
+            xi = int.from_bytes(src[i:i+bs], 'big') ^ yi
+            dst[i:i+bs] = enc(xi.to_bytes(bs, 'big'))
+            yi = int.from_bytes(dst[i:i+bs], 'big')
+        return yi
+
+    def _decrypt_into(self, src, dst, yi_1):
+        n = len(src)
+        if n == 0:
+            return yi_1
+        bs = self.block_size
+        IV = yi_1.to_bytes(bs, 'big')
+        yi_1 = int.from_bytes(src[n-bs:n], 'big')  # read before `dst` may overwrite it
+        if self._parallel(n):
+            self._decrypt_chunks(_cbc_decrypt_task, src, dst, IV)
+        else:
+            dst[:n] = _cbc_decrypt(self.cipher, IV, src)
+        return yi_1
+
+
+class CFBMode(_Mode):
+    stream = True
+
+    def __init__(self, cipher, IV, workers=1, chunk_size=1 << 16, parallel_threshold=1 << 18):
+        '''
+        Cipher Feedback Mode context
+
+        Decryption is parallel: every plaintext block depends only on two ciphertext
+        blocks, so with `workers` > 1 long inputs are split on block boundaries(with
+        one block of overlap) and decrypted by a process pool, `chunk_size` bytes per task.
+
+        :param AES cipher: the block cipher
+        :param bytes IV: initialization vector
+        :param int workers: number of worker processes(default 1), None for `os.cpu_count()`
+        :param int chunk_size: bytes of ciphertext per task
+        :param int parallel_threshold: inputs shorter than it are decrypted in this process
+        '''
+        self.cipher = cipher
+        assert isinstance(IV, bytes) and len(IV)==self.block_size
+        self.IV = IV
+        self._set_workers(workers, chunk_size, parallel_threshold)
+
+    def _initial_state(self):
+        return self.IV
+
+    def _encrypt_into(self, src, dst, yi):
+        enc = self.cipher.encrypt
+        bs = self.block_size
+        for i in range(0, len(src), bs):
+            xi = src[i:i+bs]
+            n = len(xi)
+            si = int.from_bytes(enc(yi), 'big') >> (8*(bs - n))
+            yi = (int.from_bytes(xi, 'big') ^ si).to_bytes(n, 'big')
+            dst[i:i+n] = yi
+        return yi
+
+    def _decrypt_into(self, src, dst, yi_1):
+        n = len(src)
+        if n == 0:
+            return yi_1
+        IV = yi_1
+        yi_1 = bytes(src[(n-1) - (n-1) % self.block_size:n])  # copied, `dst` may overwrite it
+        if self._parallel(n):
+            self._decrypt_chunks(_cfb_decrypt_task, src, dst, IV)
+        else:
+            dst[:n] = _cfb_decrypt(self.cipher, IV, src)
+        return yi_1
+
+
+class OFBMode(_Mode):
+    stream = True
+
+    def __init__(self, cipher, IV):
+        '''
+        Output Feedback Mode context
+
+        :param AES cipher: the block cipher
+        :param bytes IV: initialization vector
+        '''
+        self.cipher = cipher
+        assert isinstance(IV, bytes) and len(IV)==self.block_size
+        self.IV = IV
+
+    def _initial_state(self):
+        return self.IV
+
+    def _encrypt_into(self, src, dst, si):
+        # encryption and decryption are the same keystream xor
+        enc = self.cipher.encrypt
+        bs = self.block_size
+        for i in range(0, len(src), bs):
+            si = enc(si)
+            xi = src[i:i+bs]
+            n = len(xi)
+            dst[i:i+n] = (int.from_bytes(xi, 'big') ^ (int.from_bytes(si, 'big') >> (8*(bs - n)))).to_bytes(n, 'big')
+        return si
+
+    _decrypt_into = _encrypt_into
+
+
+class CTRMode(_Mode):
+    stream = True
+
+    def __init__(self, cipher, IV, workers=1, chunk_size=1 << 16, parallel_threshold=1 << 18):
+        '''
+        Counter Mode context
+
+        Every counter block is independent, so with `workers` > 1 the keystream of
+        long inputs is generated by a process pool, `chunk_size` bytes per task.
+
+        :param AES cipher: the block cipher
+        :param bytes IV: initialization vector(96-bit in length, block size minus a 32-bit counter)
+        :param int workers: number of worker processes(default 1), None for `os.cpu_count()`
+        :param int chunk_size: bytes of keystream per task
+        :param int parallel_threshold: inputs shorter than it are processed in this process
+        '''
+        self.cipher = cipher
+        assert isinstance(IV, bytes) and len(IV)==self.block_size-4
+        self.IV = IV
+        self._set_workers(workers, chunk_size, parallel_threshold)
+
+    def _initial_state(self):
+        return 0
+
+    def crypt_range(self, data, offset):
+        '''
+        Random access: encrypt(or decrypt) `data` that starts at byte `offset` of the stream
+
+        :param bytes data: any bytes-like object
+        :param int offset: position of `data[0]` in the whole plaintext(or ciphertext)
+        :rtype: bytearray
+        '''
+        src = _view(data)
+        bs = self.block_size
+        skip = offset % bs
+        CTR, nblocks = offset // bs, (skip + len(src) + bs - 1) // bs
+        _check_counter(CTR, nblocks, 1 << 32)
+        ks = _ctr_keystream(self.cipher, self.IV, CTR, nblocks)
+        out = bytearray(len(src))
+        _xor_into(memoryview(out), src, memoryview(ks)[skip:])
+        return out
+
+    def _encrypt_into(self, src, dst, CTR):
+        # encryption and decryption are the same keystream xor
+        n = len(src)
+        bs = self.block_size
+        nblocks = (n + bs - 1) // bs
+        _check_counter(CTR, nblocks, 1 << 32)
+        if self._parallel(n):
+            step = self.chunk_size
+            offsets = range(0, n, step)
+            tasks = self._map(
+                _ctr_keystream_task,
+                (self.IV for i in offsets),
+                (CTR + i // bs for i in offsets),
+                ((min(step, n - i) + bs - 1) // bs for i in offsets),
+            )
+            # results come back in order
+            for i, ks in zip(offsets, tasks):
+                _xor_into(dst[i:i+step], src[i:i+step], ks)
+        else:
+            _xor_into(dst, src, _ctr_keystream(self.cipher, self.IV, CTR, nblocks))
+        return CTR + nblocks
+
+    _decrypt_into = _encrypt_into
+
+
+class StreamCipher(object):
+    def __init__(self, mode, encrypting, pad="PKCS7"):
+        '''
+        Incremental encryption or decryption over a mode context.
+
+        The chaining state and a partial-block buffer(at most one block) are kept
+        between `update()` calls, so memory is bounded whatever the input size.
+
+        :param _Mode mode: the mode context
+        :param bool encrypting: True for encryption, False for decryption
+        :param str pad: mode of padding(default PKCS7)
+        '''
+        self._mode = mode
+        process = mode._encrypt_into if encrypting else mode._decrypt_into
+        self._init_stream(mode.block_size, encrypting, process, mode._initial_state(), pad, mode.stream)
+
+    def _init_stream(self, bs, encrypting, process, state, pad, stream):
+        '''
+        The state of every incremental object, apart from where the blocks go
+
+        :param int bs: block size in bytes
+        :param bool encrypting: True for encryption, False for decryption
+        :param process: `process(src, dst, state)` returning the next chaining state
+        :param state: chaining state before the first block
+        :param str pad: mode of padding
+        :param bool stream: whether a partial last block is allowed without padding
+        '''
+        self._bs = bs
+        self._encrypting = encrypting
+        self._process = process
+        self._state = state
+        self._pad = pad
+        self._stream = stream
+        self._buf = bytearray()
+        self._finalized = False
+
+    def update(self, data):
+        '''
+        Process the next chunk of input
+
+        :param bytes data: any bytes-like object
+        :return: output of all the blocks completed so far
+        :rtype: bytearray
+        '''
+        src = _view(data)
+        out = bytearray(self._ready(len(src)))
+        self.update_into(src, out)
+        return out
+
+    def update_into(self, data, out):
+        '''
+        Process the next chunk of input, writing the output into a caller-provided buffer
+
+        :param bytes data: any bytes-like object
+        :param bytearray out: writable buffer, at least `len(data)` plus one block is always enough
+        :return: number of bytes written into `out`
+        :rtype: int
+        '''
+        if self._finalized:
+            raise ValueError("Context was already finalized")
+        src = _view(data)
+        buf = self._buf
+        k = len(buf)
+        n = self._ready(len(src))
+        if n == 0:
+            buf += src
+            return 0
+        dst = _view(out)
+        if len(dst) < n:
+            raise ValueError(f"output buffer too small, {n} bytes needed, {len(dst)} given")
+        dst = dst[:n]
+        m = 0
+        if k:
+            # complete the buffered block first
+            bs = self._bs
+            m = bs - k if k < bs else 0
+            buf += src[:m]
+            self._state = self._process(memoryview(buf), dst[:bs], self._state)
+            dst = dst[bs:]
+        rest = len(dst)
+        self._state = self._process(src[m:m+rest], dst, self._state)
+        self._buf = bytearray(src[m+rest:])
+        return n
+
+    def _ready(self, length):
+        '''
+        Number of output bytes that `length` more bytes of input complete
+        '''
+        total = len(self._buf) + length
+        n = total - total % self._bs
+        # the last block of a padded plaintext is held back until `finalize()`
+        if not self._encrypting and self._pad != "None" and n == total:
+            n -= self._bs
+        return max(n, 0)
+
+    def finalize(self):
+        '''
+        Process the buffered input, applying(or stripping) the padding
+
+        :return: the remaining output
+        :rtype: bytes
+        '''
+        if self._finalized:
+            raise ValueError("Context was already finalized")
+        self._finalized = True
+        tail = bytes(self._buf)
+        self._buf = bytearray()
+        pad = self._pad
+        if self._encrypting:
+            if not (self._stream and pad == "None"):
+                tail = padding(tail, pad, self._bs)
+        elif len(tail) % self._bs != 0 and not (self._stream and pad == "None"):
+            raise ValueError(f"The length of ciphertext must be the mutiple of {self._bs}")
+        out = bytearray(len(tail))
+        self._process(memoryview(tail), memoryview(out), self._state)
+        if not self._encrypting:
+            return unpadding(bytes(out), pad, self._bs)
+        return bytes(out)
+
+
+class GHASH(object):
+    # R = 11100001 || 0^120, the reduction constant of GF(2^128) in GCM's bit order
+    R = 0xE1 << 120
+
+    def __init__(self, H, table_bits=8):
+        '''
+        GHASH keyed by the hash subkey H, multiplication by H done with Shoup's tables.
+
+        A block is taken as a 128-bit big-endian integer, whose most significant bit is
+        the coefficient of x^0; multiplication by x is thus a right shift.
+        With `table_bits` = w, a product costs 128/w steps of one shift and two lookups
+        into 2^w-entry tables: w = 8 keeps 512 integers(~25KB) per key, w = 4 only 32.
+
+        :param bytes H: 128-bit hash subkey, E_K(0^128)
+        :param int table_bits: 4 or 8(default)
+        '''
+        assert table_bits in (4, 8), f"table_bits must be 4 or 8, not {table_bits}"
+        self.table_bits = table_bits
+        w = table_bits
+        # M[i] = (i << (128-w)) • H, i.e. the w-bit polynomial i times H
+        M = [0] * (1 << w)
+        V = int.from_bytes(H, 'big')
+        for j in range(w):
+            M[1 << (w-1-j)] = V
+            V = (V >> 1) ^ (GHASH.R if V & 1 else 0)
+        for i in range(1, 1 << w):
+            low = i & -i
+            M[i] = M[low] ^ M[i ^ low]
+        # Rt[r]: what the w bits r shifted out by `Z >> w` reduce to, so that Z • x^w = (Z >> w) ^ Rt[Z & mask]
+        Rt = [0] * (1 << w)
+        for r in range(1 << w):
+            V = r
+            for _ in range(w):
+                V = (V >> 1) ^ (GHASH.R if V & 1 else 0)
+            Rt[r] = V
+        self._M = tuple(M)
+        self._Rt = tuple(Rt)
+
+    def mul(self, X):
+        '''
+        :param int X: 128-bit block
+        :return: X • H over GF(2^128)
+        :rtype: int
+        '''
+        M, Rt = self._M, self._Rt
+        w = self.table_bits
+        mask = (1 << w) - 1
+        # Horner's rule from the least significant w bits(the highest powers of x)
+        Z = 0
+        for _ in range(128 // w):
+            Z = (Z >> w) ^ Rt[Z & mask] ^ M[X & mask]
+            X >>= w
+        return Z
+
+    def update(self, Y, data):
+        '''
+        Absorb `data` into the GHASH state, zero-padding its partial last block
+
+        :param int Y: current state
+        :param bytes data: any bytes-like object
+        :return: the new state
+        :rtype: int
+        '''
+        mul = self.mul
+        n = len(data)
+        for i in range(0, n - n % 16, 16):
+            Y = mul(Y ^ int.from_bytes(data[i:i+16], 'big'))
+        if n % 16:
+            Y = mul(Y ^ int.from_bytes(data[n - n % 16:], 'big') << (8 * (16 - n % 16)))
+        return Y
+
+
+# SP 800-38D 5.2.1.1, the plaintext is at most 2^32 - 2 blocks
+GCM_MAX_BLOCKS = (1 << 32) - 2
+
+class GCMMode(object):
+    def __init__(self, cipher, table_bits=8):
+        '''
+        Galois Counter Mode context(NIST SP 800-38D).
+
+        The hash subkey and its GHASH tables are computed once here, so the context is
+        meant to be kept per key and used with a fresh IV for every message.
+
+        :param AES cipher: the block cipher(128-bit block)
+        :param int table_bits: size of the GHASH tables, 8(default, faster) or 4(less memory)
+        '''
+        assert getattr(cipher, 'block_size', 16) == 16, "GCM needs a 128-bit block cipher"
+        self.cipher = cipher
+        self.ghash = GHASH(cipher.encrypt(bytes(16)), table_bits)
+
+    def encrypt(self, IV, pt, AAD=b""):
+        '''
+        :param bytes IV: initialization vector(96-bit recommended)
+        :param bytes pt: plaintext
+        :param bytes AAD: additional authenticated data
+        :return: ciphertext, 128-bit authentication tag
+        :rtype: (bytearray, bytes)
+        '''
+        e = self.encryptor(IV, AAD)
+        ct = e.update(pt)
+        ct += e.finalize()
+        return ct, e.tag
+
+    def decrypt(self, IV, ct, T, AAD=b""):
+        '''
+        :param bytes IV: initialization vector(96-bit recommended)
+        :param bytes ct: ciphertext
+        :param bytes T: authentication tag(4 ~ 16 bytes)
+        :param bytes AAD: additional authenticated data
+        :return: plaintext
+        :rtype: bytearray
+        :raise ValueError: if the authentication fails
+        '''
+        d = self.decryptor(IV, T, AAD)
+        pt = d.update(ct)
+        pt += d.finalize()
+        return pt
+
+    def encryptor(self, IV, AAD=b""):
+        '''
+        Return an incremental encryption object, the tag is available as its `tag` after `finalize()`
+
+        :rtype: GCMStream
+        '''
+        return GCMStream(self, IV, AAD, True)
+
+    def decryptor(self, IV, T, AAD=b""):
+        '''
+        Return an incremental decryption object, the tag is verified in its `finalize()`.
+        N.B. `update()` releases plaintext before it is authenticated.
+
+        :rtype: GCMStream
+        '''
+        return GCMStream(self, IV, AAD, False, T)
+
+    def decrypt_range(self, IV, data, offset):
+        '''
+        Random access: decrypt `data` that starts at byte `offset` of the ciphertext.
+        N.B. the result is NOT authenticated, only the whole ciphertext can be verified.
+
+        :param bytes IV: initialization vector
+        :param bytes data: any bytes-like object
+        :param int offset: position of `data[0]` in the whole ciphertext
+        :rtype: bytearray
+        '''
+        J0 = self._pre_counter(IV)
+        src = _view(data)
+        skip = offset % 16
+        first, nblocks = offset // 16, (skip + len(src) + 15) // 16
+        _check_counter(first, nblocks, GCM_MAX_BLOCKS)
+        # inc32 wraps the 32-bit counter field, SP 800-38D 6.5
+        CTR = (int.from_bytes(J0[12:], 'big') + 1 + first) & 0xFFFFFFFF
+        ks = _ctr_keystream(self.cipher, J0[:12], CTR, nblocks)
+        out = bytearray(len(src))
+        _xor_into(memoryview(out), src, memoryview(ks)[skip:])
+        return out
+
+    def _pre_counter(self, IV):
+        '''
+        :param bytes IV: initialization vector
+        :return: the pre-counter block J0
+        :rtype: bytes
+        '''
+        assert isinstance(IV, bytes) and len(IV) > 0
+        if len(IV) == 12:
+            return IV + b'\x00\x00\x00\x01'
+        return self.ghash.update(self.ghash.update(0, IV), (8*len(IV)).to_bytes(16, 'big')).to_bytes(16, 'big')
+
+
+class GCMStream(StreamCipher):
+    def __init__(self, gcm, IV, AAD, encrypting, T=None):
+        '''
+        Incremental GCM encryption or decryption
+
+        :param GCMMode gcm: the GCM context
+        :param bytes IV: initialization vector
+        :param bytes AAD: additional authenticated data
+        :param bool encrypting: True for encryption, False for decryption
+        :param bytes T: the expected tag when decrypting
+        '''
+        if not encrypting:
+            assert isinstance(T, bytes) and 4 <= len(T) <= 16
+        # no padding and no block held back
+        self._init_stream(16, encrypting, self._crypt, None, "None", True)
+        self._gcm = gcm
+        J0 = gcm._pre_counter(IV)
+        self._nonce = J0[:12]
+        self._CTR = (int.from_bytes(J0[12:], 'big') + 1) & 0xFFFFFFFF
+        self._eJ0 = gcm.cipher.encrypt(J0)
+        self._Y = gcm.ghash.update(0, AAD)
+        self._len_A = len(AAD)
+        self._len_C = 0
+        self._T = T
+        self.tag = None
+
+    def _crypt(self, src, dst, state):
+        n = len(src)
+        if n == 0:
+            return state
+        ghash = self._gcm.ghash
+        if not self._encrypting:
+            self._Y = ghash.update(self._Y, src)  # before `dst` may overwrite it
+        nblocks = (n + 15) // 16
+        _check_counter(self._len_C // 16, nblocks, GCM_MAX_BLOCKS)
+        _xor_into(dst, src, _ctr_keystream(self._gcm.cipher, self._nonce, self._CTR, nblocks))
+        self._CTR = (self._CTR + nblocks) & 0xFFFFFFFF
+        if self._encrypting:
+            self._Y = ghash.update(self._Y, dst)
+        self._len_C += n
+        return state
+
+    def finalize(self):
+        '''
+        Process the buffered input and compute(or verify) the tag
+
+        :return: the remaining output
+        :rtype: bytes
+        :raise ValueError: if the authentication fails
+        '''
+        if self._finalized:
+            raise ValueError("Context was already finalized")
+        self._finalized = True
+        tail = bytes(self._buf)
+        out = bytearray(len(tail))
+        self._crypt(memoryview(tail), memoryview(out), None)
+        S = self._gcm.ghash.mul(self._Y ^ (8*self._len_A) << 64 ^ 8*self._len_C)
+        self.tag = (S ^ int.from_bytes(self._eJ0, 'big')).to_bytes(16, 'big')
+        if not self._encrypting and not hmac.compare_digest(self.tag[:len(self._T)], self._T):
+            raise ValueError("Authentication failed")
+        return bytes(out)
+
+
+def _encrypt_blocks(cipher, buf):
+    '''
+    Encrypt whole blocks with the batched `encrypt_blocks` of the cipher if it has one
+
+    :param AES cipher: the block cipher
+    :param bytes buf: bytes-like object of whole blocks
+    :rtype: bytes-like object
+    '''
+    if hasattr(cipher, 'encrypt_blocks'):
+        return cipher.encrypt_blocks(buf)
+    enc = cipher.encrypt
+    bs = getattr(cipher, 'block_size', 16)
+    return b''.join([enc(bytes(buf[i:i+bs])) for i in range(0, len(buf), bs)])
+
+def _decrypt_blocks(cipher, buf):
+    '''
+    Decrypt whole blocks with the batched `decrypt_blocks` of the cipher if it has one
+
+    :param AES cipher: the block cipher
+    :param bytes buf: bytes-like object of whole blocks
+    :rtype: bytes-like object
+    '''
+    if hasattr(cipher, 'decrypt_blocks'):
+        return cipher.decrypt_blocks(buf)
+    dec = cipher.decrypt
+    bs = getattr(cipher, 'block_size', 16)
+    return b''.join([dec(bytes(buf[i:i+bs])) for i in range(0, len(buf), bs)])
+
+def _ctr_keystream(cipher, IV, CTR, nblocks):
+    '''
+    Generate `nblocks` blocks of CTR keystream
+
+    :param AES cipher: the block cipher
+    :param bytes IV: nonce, the block minus a 32-bit counter
+    :param int CTR: counter of the first block
+    :param int nblocks: number of blocks
+    :rtype: bytes-like object
+    '''
+    bs = len(IV) + 4
+    nonce = int.from_bytes(IV, 'big') << 32
+    # the counter field wraps only for GCM's inc32, the callers stop before a counter block repeats
+    counters = b''.join([(nonce | (CTR + i) & 0xFFFFFFFF).to_bytes(bs, 'big') for i in range(nblocks)])
+    return _encrypt_blocks(cipher, counters)
+
+def _check_counter(first, nblocks, limit):
+    '''
+    Refuse to run past the last counter block, reusing keystream would be a two-time pad
+
+    :param int first: index of the first block from the start of the message
+    :param int nblocks: number of blocks
+    :param int limit: number of blocks a single IV covers
+    :raise ValueError: if blocks `first` ~ `first+nblocks-1` go beyond `limit`
+    '''
+    if first + nblocks > limit:
+        raise ValueError(f"counter exhausted, at most {limit} blocks can be processed under one IV")
+
+def _xor_into(dst, src, ks):
+    '''
+    dst = src ^ ks[:len(src)], as one big-integer xor
+    '''
+    n = len(src)
+    dst[:n] = (int.from_bytes(src, 'big') ^ int.from_bytes(ks[:n], 'big')).to_bytes(n, 'big')
+
+
+def _cbc_decrypt(cipher, IV, src):
+    '''
+    CBC decryption of whole blocks: decrypt all the blocks first, then xor them
+    with the ciphertext shifted by one block in one pass
+
+    :param AES cipher: the block cipher
+    :param bytes IV: the block preceding `src`
+    :param memoryview src: ciphertext
+    :rtype: bytes
+    '''
+    n, bs = len(src), len(IV)
+    if n == 0:
+        return b''
+    xored = _decrypt_blocks(cipher, src)
+    shifted = int.from_bytes(IV, 'big') << (8*(n - bs)) | int.from_bytes(src[:n-bs], 'big')
+    return (int.from_bytes(xored, 'big') ^ shifted).to_bytes(n, 'big')
+
+def _cfb_decrypt(cipher, IV, src):
+    '''
+    CFB decryption: encrypt the ciphertext shifted by one block, then xor with the
+    ciphertext in one pass; the last block may be partial
+
+    :param AES cipher: the block cipher
+    :param bytes IV: the block preceding `src`
+    :param memoryview src: ciphertext
+    :rtype: bytes
+    '''
+    n, bs = len(src), len(IV)
+    if n == 0:
+        return b''
+    si = _encrypt_blocks(cipher, bytes(IV) + bytes(src[:(n-1) - (n-1) % bs]))
+    return (int.from_bytes(src, 'big') ^ int.from_bytes(si[:n], 'big')).to_bytes(n, 'big')
+
+
+# worker processes, each holding its own copy of the cipher
+_worker_cipher = None
+
+def _init_worker(cipher):
+    global _worker_cipher
+    _worker_cipher = cipher
+
+def _ctr_keystream_task(IV, CTR, nblocks):
+    return _ctr_keystream(_worker_cipher, IV, CTR, nblocks)
+
+def _cbc_decrypt_task(IV, chunk):
+    return _cbc_decrypt(_worker_cipher, IV, chunk)
+
+def _cfb_decrypt_task(IV, chunk):
+    return _cfb_decrypt(_worker_cipher, IV, chunk)
+
+
+def _view(b):
+    '''
+    Return a flat byte view of a bytes-like object without copying it
+    '''
+    return memoryview(b).cast('B')
+
+def _output(out, size):
+    '''
+    Prepare the output buffer for `size` bytes
+
+    :param bytearray out: caller-provided writable buffer, or None to allocate one
+    :param int size: number of bytes to be written
+    :return: the result to be returned, a writable memoryview over it
+    :raise ValueError: if `out` is too small
+    '''
+    if out is None:
+        out = bytearray(size)
+        return out, memoryview(out)
+    dst = _view(out)
+    if len(dst) < size:
+        raise ValueError(f"output buffer too small, {size} bytes needed, {len(dst)} given")
+    dst = dst[:size]
+    return dst, dst
+
+
+def _cipher(k):
+    '''
+    Return `k` itself if it is already a cipher object(e.g. `AES` or `SM4`), otherwise expand it as an AES key
+    '''
+    return k if hasattr(k, 'encrypt') else AES(k)
+
+
+'''Functional interface'''
+# `k` may be AES key bytes or a cipher object(`AES`, `SM4`, ...); pass an object
+# (or use the mode contexts above) to avoid expanding the same key again on every call.
 def AES_ECB_enc(pt, k, pad="PKCS7"):
     '''
     Electronic Codebook Mode encryption of AES
 
     :param bytes pt: plaintext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param str pad: mode of padding(default PKCS7)
     :return: ciphertext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    pt = padding(pt, pad)
-    ct = b''
-    for i in range(0, len(pt), 16):
-        ct += AES_enc(pt[i:i+16], k)
-    return ct
+    return ECBMode(_cipher(k)).encrypt(pt, pad)
 
 def AES_ECB_dec(ct, k):
     '''
     Electronic Codebook Mode decryption of AES
 
     :param bytes ct: ciphertext
-    :param bytes k: key
+    :param bytes or AES k: key
     :return: plaintext(padded)
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    pt = b''
-    for i in range(0, len(ct), 16):
-        pt += AES_dec(ct[i:i+16], k)
-    return pt
+    return ECBMode(_cipher(k)).decrypt(ct)
 
 def AES_CBC_enc(pt, k, IV, pad="PKCS7"):
     '''
     Cipher Block Chaining Mode encryption of AES
 
     :param bytes pt: plaintext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :param str pad: mode of padding(default PKCS7)
     :return: ciphertext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==16
-    pt = padding(pt, pad)
-    ct = b''
-    yi = IV
-    for i in range(0, len(pt), 16):
-        xi = bytes([pt[i+b]^yi[b] for b in range(16)])
-        yi = AES_enc(xi, k)
-        ct += yi
-    return ct
+    return CBCMode(_cipher(k), IV).encrypt(pt, pad)
 
 def AES_CBC_dec(ct, k, IV):
     '''
     Cipher Block Chaining Mode decryption of AES
 
     :param bytes ct: ciphertext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :return: plaintext(padded)
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==16
-    pt = b''
-    yi_1 = IV
-    for i in range(0, len(ct), 16):
-        yi = ct[i:i+16]
-        xored = AES_dec(yi, k)
-        xi = bytes([xored[b] ^ yi_1[b] for b in range(16)])
-        pt += xi
-        yi_1 = yi
-    return pt
+    return CBCMode(_cipher(k), IV).decrypt(ct)
 
 def AES_CFB_enc(pt, k, IV, pad="PKCS7"):
     '''
     Cipher Feedback Mode encryption of AES
 
     :param bytes pt: plaintext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :param str pad: mode of padding(default PKCS7)
     :return: ciphertext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==16
-    pt = padding(pt, pad)
-    ct = b''
-    yi = IV
-    for i in range(0, len(pt), 16):
-        si = AES_enc(yi, k)
-        xi = pt[i:i+16]
-        yi = bytes([xi[b] ^ si[b] for b in range(16)])
-        ct += yi
-    return ct
+    return CFBMode(_cipher(k), IV).encrypt(pt, pad)
 
 def AES_CFB_dec(ct, k, IV):
     '''
     Cipher Feedback Mode decryption of AES
 
     :param bytes ct: ciphertext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :return: plaintext(padded)
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==16
-    pt = b''
-    yi_1 = IV
-    for i in range(0, len(ct), 16):
-        si = AES_enc(yi_1, k)
-        yi = ct[i:i+16]
-        xi = bytes([yi[b] ^ si[b] for b in range(16)])
-        pt += xi
-        yi_1 = yi
-    return pt
+    return CFBMode(_cipher(k), IV).decrypt(ct)
 
 def AES_OFB_enc(pt, k, IV, pad="PKCS7"):
     '''
     Output Feedback Mode encryption of AES
     
     :param bytes pt: plaintext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :param str pad: mode of padding(default PKCS7)
     :return: ciphertext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==16
-    pt = padding(pt, pad)
-    ct = b''
-    si_1 = IV
-    for i in range(0, len(pt), 16):
-        si = AES_enc(si_1, k)
-        xi = pt[i:i+16]
-        yi = bytes([xi[b] ^ si[b] for b in range(16)])
-        ct += yi
-        si_1 = si
-    return ct
+    return OFBMode(_cipher(k), IV).encrypt(pt, pad)
 
 def AES_OFB_dec(ct, k, IV):
     '''
     Output Feedback Mode decryption of AES
 
     :param bytes ct: ciphertext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector
     :return: plaintext(padded)
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV) == 16
-    pt = b''
-    si_1 = IV
-    for i in range(0, len(ct), 16):
-        si = AES_enc(si_1, k)
-        yi = ct[i:i+16]
-        xi = bytes([yi[b] ^ si[b] for b in range(16)])
-        pt += xi
-        si_1 = si
-    return pt
+    return OFBMode(_cipher(k), IV).decrypt(ct)
 
 def AES_CTR_enc(pt, k, IV, pad="PKCS7"):
     '''
     Counter Mode encryption of AES
 
     :param bytes pt: plaintext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector(96-bit in length)
     :param str pad: mode of padding(default PKCS7)
     :return: ciphertext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==12
-    pt =padding(pt, pad)
-    CTR = 0
-    ct = b''
-    for i in range(0, len(pt), 16):
-        si = AES_enc(IV + CTR.to_bytes(4, 'big'), k)
-        xi = pt[i:i+16]
-        yi = bytes([xi[b] ^ si[b] for b in range(16)])
-        ct += yi
-        CTR += 1
-    return ct
+    return CTRMode(_cipher(k), IV).encrypt(pt, pad)
 
 def AES_CTR_dec(ct, k, IV):
     '''
     Counter Mode decryption of AES
 
     :param bytes ct: ciphertext
-    :param bytes k: key
+    :param bytes or AES k: key
     :param bytes IV: initialization vector(96-bit in length)
     :return: plaintext
-    :rtype: bytes
+    :rtype: bytearray
     '''
-    assert isinstance(IV, bytes) and len(IV)==12
-    CTR = 0
-    pt = b''
-    for i in range(0, len(ct), 16):
-        si = AES_enc(IV + CTR.to_bytes(4, 'big'), k)
-        yi = ct[i:i+16]
-        xi = bytes([yi[b] ^ si[b] for b in range(16)])
-        pt += xi
-        CTR += 1
-    return pt
+    return CTRMode(_cipher(k), IV).decrypt(ct)
 
 
-def AES_GCM(pt, k, IV, AAD, pad="PKCS7"):
+def AES_GCM_enc(pt, k, IV, AAD=b""):
     '''
-    Galois Counter Mode of AES
+    Galois Counter Mode encryption of AES
 
     :param bytes pt: plaintext
-    :param bytes k: key
-    :param bytes IV: initialization vector(96-bit in length)
+    :param bytes or AES k: key
+    :param bytes IV: initialization vector(96-bit recommended)
     :param bytes AAD: additional authenticated data
-    :param str pad: mode of padding(default PKCS7)
-    :return: final authentication tag
-    :rtype: bytes
+    :return: ciphertext, 128-bit authentication tag
+    :rtype: (bytearray, bytes)
+    '''
+    return GCMMode(_cipher(k)).encrypt(IV, pt, AAD)
+
+def AES_GCM_dec(ct, k, IV, T, AAD=b""):
+    '''
+    Galois Counter Mode decryption of AES
+
+    :param bytes ct: ciphertext
+    :param bytes or AES k: key
+    :param bytes IV: initialization vector(96-bit recommended)
+    :param bytes T: authentication tag
+    :param bytes AAD: additional authenticated data
+    :return: plaintext
+    :rtype: bytearray
+    :raise ValueError: if the authentication fails
+    '''
+    return GCMMode(_cipher(k)).decrypt(IV, ct, T, AAD)
+
+
+'''Files'''
+def crypt_file(stream, src, dst, window=1 << 20):
     '''
-    from Arithmetic import gmul128
-    bxor = lambda x, y: bytes([x[i]^y[i] for i in len(x)])
-    assert isinstance(IV, bytes) and len(IV)==12
-    pt = padding(pt, pad)
-    # encrypt CTR0
-    CTR = 0
-    CTR0 = IV + CTR.to_bytes(4, 'big')
-    eCTR0 = AES_enc(CTR0, k)
-    # authentication subkey H = Ek(0)
-    H = AES_enc(0, k)
-    # compute gi
-    gi = gmul128(AAD, H)
-    for i in range(0, len(pt), 16):
-        CTR += 1
-        CTRi = IV + CTR.to_bytes(4, 'big')
-        si = AES_enc(CTRi, k)
-        xi = pt[i:i+16]
-        yi = bxor(xi, si)
-        gi = gmul128(bxor(gi,yi), H)
-    # compute final authentication tag 
-    T = bxor(gmul128(gi,H), eCTR0)
-    return T
-    # not test
\ No newline at end of file
+    Run a whole file through an encryptor or decryptor.
+
+    The input is memory-mapped and fed in `window`-byte slices; the output goes to a
+    temporary file next to `dst`, preallocated, memory-mapped and written in place, and
+    replaces `dst` only once `finalize()` has succeeded. If anything fails(bad padding,
+    authentication failure, I/O error, interrupt) the temporary file is removed and an
+    existing `dst` is left untouched.
+
+    :param StreamCipher stream: e.g. `CBCMode(aes, IV).encryptor()` or `GCMMode(aes).decryptor(IV, T)`
+    :param str src: path of the input file
+    :param str dst: path of the output file, not the input file itself
+    :param int window: bytes per slice, rounded down to whole blocks
+    :return: length of the output file
+    :rtype: int
+    :raise ValueError: if `src` and `dst` are the same file
+    '''
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise ValueError("the output file must not be the input file")
+    bs = stream._bs
+    window = max(bs, window - window % bs)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst)), prefix="." + os.path.basename(dst) + ".")
+    try:
+        with open(src, 'rb') as fi, os.fdopen(fd, 'w+b') as fo:
+            size = os.fstat(fi.fileno()).st_size
+            # the output is at most one(padding) block longer than the input
+            fo.truncate(size + bs)
+            written = 0
+            with _mmap_view(fi, mmap.ACCESS_READ) as s, _mmap_view(fo, mmap.ACCESS_WRITE) as d:
+                for off in range(0, size, window):
+                    written += stream.update_into(s[off:off+window], d[written:])
+                tail = stream.finalize()
+                d[written:written+len(tail)] = tail
+                written += len(tail)
+            fo.truncate(written)
+        os.replace(tmp, dst)
+    except BaseException:
+        # bad padding, authentication failure, I/O error, interrupt: no partial output is left behind
+        os.remove(tmp)
+        raise
+    return written
+
+def decrypt_file_range(mode, src, offset, length, IV=None):
+    '''
+    Random access: decrypt `length` bytes at `offset` of a CTR or GCM encrypted file,
+    reading only that range of the file(GCM ranges are NOT authenticated).
+
+    :param mode: `CTRMode` or `GCMMode` context
+    :param str src: path of the ciphertext file
+    :param int offset: position of the first byte
+    :param int length: number of bytes
+    :param bytes IV: initialization vector, for `GCMMode` only
+    :rtype: bytearray
+    '''
+    with open(src, 'rb') as fi, _mmap_view(fi, mmap.ACCESS_READ) as s, s[offset:offset+length] as data:
+        if isinstance(mode, GCMMode):
+            return mode.decrypt_range(IV, data, offset)
+        return mode.crypt_range(data, offset)
+
+
+class _mmap_view(object):
+    '''
+    `with _mmap_view(f, access) as view`: a memoryview of the whole file `f`,
+    released and unmapped on exit(an empty file gives an empty view)
+    '''
+    def __init__(self, f, access):
+        size = os.fstat(f.fileno()).st_size
+        self._map = mmap.mmap(f.fileno(), 0, access=access) if size else None
+        self._view = memoryview(self._map) if size else memoryview(bytearray())
+
+    def __enter__(self):
+        return self._view
+
+    def __exit__(self, *exc):
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # a slice is still referenced(e.g. by a traceback), unmapped once collected
+                pass
+
+
+# block ciphers of the command line, and their key lengths in bytes
+CIPHERS = {"AES": AES, "SM4": SM4, "3DES": TripleDES}
+KEY_SIZES = {"AES": (16, 24, 32), "SM4": (16,), "3DES": (16, 24)}
+
+def main(argv=None):
+    '''
+    Command line entry point, `python -m AES_modes -h` for usage
+    '''
+    parser = argparse.ArgumentParser(prog="python -m AES_modes", description="Encrypt or decrypt a file with AES, SM4 or 3DES.")
+    parser.add_argument("action", choices=["encrypt", "decrypt"])
+    parser.add_argument("src", help="input file")
+    parser.add_argument("dst", nargs="?", help="output file(not used with --range)")
+    parser.add_argument("-m", "--mode", choices=["ECB", "CBC", "CFB", "OFB", "CTR", "GCM"], default="CBC")
+    parser.add_argument("-c", "--cipher", choices=sorted(CIPHERS), default="AES")
+    parser.add_argument("-k", "--key", required=True, help="key in hex")
+    parser.add_argument("--iv", default="", help="IV in hex")
+    parser.add_argument("--aad", default="", help="GCM additional authenticated data in hex")
+    parser.add_argument("--tag", default="", help="GCM tag in hex, to verify when decrypting")
+    parser.add_argument("--pad", default="PKCS7", help="mode of padding(default PKCS7)")
+    parser.add_argument("--window", type=int, default=1 << 20, help="bytes per window")
+    parser.add_argument("--range", nargs=2, type=int, metavar=("OFFSET", "LENGTH"),
+                        help="CTR/GCM: decrypt only this byte range, written to stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        key, IV = bytes.fromhex(args.key), bytes.fromhex(args.iv)
+        AAD, T = bytes.fromhex(args.aad), bytes.fromhex(args.tag)
+    except ValueError as e:
+        parser.error(f"bad hex: {e}")
+    if len(key) not in KEY_SIZES[args.cipher]:
+        parser.error(f"{args.cipher} key must be {' or '.join(map(str, KEY_SIZES[args.cipher]))} bytes, not {len(key)}")
+    cipher = CIPHERS[args.cipher](key)
+    bs = cipher.block_size
+    IV_size = {"ECB": len(IV), "CBC": bs, "CFB": bs, "OFB": bs, "CTR": bs - 4, "GCM": max(1, len(IV))}[args.mode]
+    if len(IV) != IV_size:
+        parser.error(f"{args.mode} IV must be {IV_size} bytes, not {len(IV)}")
+    if args.mode == "GCM":
+        if bs != 16:
+            parser.error("GCM needs a 128-bit block cipher")
+        mode = GCMMode(cipher)
+    else:
+        mode = {
+            "ECB": lambda: ECBMode(cipher),
+            "CBC": lambda: CBCMode(cipher, IV),
+            "CFB": lambda: CFBMode(cipher, IV),
+            "OFB": lambda: OFBMode(cipher, IV),
+            "CTR": lambda: CTRMode(cipher, IV),
+        }[args.mode]()
+
+    if args.range:
+        if args.mode not in ("CTR", "GCM"):
+            parser.error("--range needs CTR or GCM mode")
+        offset, length = args.range
+        sys.stdout.buffer.write(decrypt_file_range(mode, args.src, offset, length, IV))
+        return 0
+    if args.dst is None:
+        parser.error("the output file is required")
+
+    if args.mode == "GCM":
+        if args.action == "encrypt":
+            stream = mode.encryptor(IV, AAD)
+        else:
+            if not 4 <= len(T) <= 16:
+                parser.error(f"GCM tag must be 4 ~ 16 bytes, not {len(T)}")
+            stream = mode.decryptor(IV, T, AAD)
+    elif args.action == "encrypt":
+        stream = mode.encryptor(args.pad)
+    else:
+        stream = mode.decryptor(args.pad)
+    try:
+        crypt_file(stream, args.src, args.dst, args.window)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    if args.mode == "GCM" and args.action == "encrypt":
+        print(stream.tag.hex())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,12 @@
 DES (Data Encryption Standard) implementation.
 '''
 
-from Utility import Block2Bytes, BlockXor, Bytes2Block, Permute
+from Utility import BitPermutation, Block2Bytes, BlockXor, BytePermutation, Bytes2Block, Permute, PermuteInt, key_schedule_cache
+
+try:
+    import numpy as np  # optional, accelerates `encrypt_blocks` / `decrypt_blocks`
+except ImportError:
+    np = None
 
 '''Permutation Table'''
 IP_table = [
@@ -244,7 +249,7 @@ def gen_key(key):
     Generate the sixteen subkeys according to the key.
 
     :param bytes key: The key to generate sixteen subkeys
-    :return: lists of the sixteen subkeys
+    :return: the sixteen subkeys, shared through the cache and not to be modified
     :rtype: list
     :raises TypeError: if the type of key is not `bytes`
     :raises ValueError: if @key is not 56-bit or 64-bit in length
@@ -252,6 +257,13 @@ def gen_key(key):
     # convert string key to bytes key
     if type(key) != bytes:
         raise TypeError("key must be type `bytes`")
+    # expanded once per key, see `Utility.KeyScheduleCache`
+    return key_schedule_cache.get("DES", key, lambda: _expand_key(key))
+
+def _expand_key(key):
+    '''
+    The key schedule behind `gen_key`, PC-1, rotations and PC-2 over bit lists.
+    '''
     bkey = Bytes2Block(key)
     subkey = []
     if len(bkey) == 64:
@@ -298,6 +310,362 @@ def PC_2(CiDi):
 
 
 
+'''Integer engine'''
+# Blocks as 64-bit integers (bit 1 of the tables is the most significant bit):
+# IP/FP/PC-1/PC-2 are `BytePermutation`s, xors of byte-indexed lookup tables, and each S-box is merged
+# with the permutation P into a 64-entry table SP[i] of 32-bit words.
+# Outputs are identical to `DES_enc`/`DES_dec`/`gen_key`.
+def _sp_table(i):
+    '''
+    S-box i merged with the permutation P: 6-bit input -> 32-bit output
+    '''
+    table = []
+    for b in range(64):
+        row = ((b >> 4) & 2) | (b & 1)
+        col = (b >> 1) & 0xF
+        table.append(PermuteInt(sbox[i][16 * row + col] << (28 - 4*i), Permutation_table, 32))
+    return table
+
+IP_perm = BytePermutation(IP_table, 64)
+FP_perm = BytePermutation(FP_table, 64)
+PC_1_perm = BytePermutation(PC_1_table, 64)
+PC_2_perm = BytePermutation(PC_2_table, 56)
+SP = [_sp_table(i) for i in range(8)]
+# planned shift-and-mask networks of IP and FP, for NumPy arrays of blocks
+IP_bits = BitPermutation(IP_table, 64)
+FP_bits = BitPermutation(FP_table, 64)
+if np is not None:
+    _np_SP = [np.array(t, dtype=np.uint64) for t in SP]
+
+def DES_crypt_int(x, subkey):
+    '''
+    The 16 rounds of DES on a 64-bit integer.
+
+    :param int x: 64-bit input block
+    :param list subkey: sixteen 48-bit integer subkeys(reversed for decryption)
+    :return: 64-bit output block
+    :rtype: int
+    '''
+    # Initial permutation
+    x = IP_perm(x)
+    L, R = _rounds(x >> 32, x & 0xFFFFFFFF, subkey)
+    # swap the halves, then the final permutation
+    return FP_perm(R << 32 | L)
+
+def _rounds(L, R, subkey):
+    '''
+    The Feistel rounds between IP and FP, one per subkey.
+
+    :return: the halves (L, R) before the final swap
+    '''
+    SP1, SP2, SP3, SP4, SP5, SP6, SP7, SP8 = SP
+    for k in subkey:
+        # Expansion as six-bit windows over R extended by one bit on each side
+        e = (R & 1) << 33 | R << 1 | R >> 31
+        L, R = R, L ^ (
+            SP1[((e >> 28) ^ (k >> 42)) & 0x3F] ^ SP2[((e >> 24) ^ (k >> 36)) & 0x3F] ^
+            SP3[((e >> 20) ^ (k >> 30)) & 0x3F] ^ SP4[((e >> 16) ^ (k >> 24)) & 0x3F] ^
+            SP5[((e >> 12) ^ (k >> 18)) & 0x3F] ^ SP6[((e >> 8) ^ (k >> 12)) & 0x3F] ^
+            SP7[((e >> 4) ^ (k >> 6)) & 0x3F] ^ SP8[(e ^ k) & 0x3F]
+        )
+    return L, R
+
+def _crypt_array(x, stages):
+    '''
+    DES stages over a NumPy uint64 array of blocks, the rounds of `_rounds` as array
+    operations; IP and FP are `BitPermutation` networks, which beat the byte tables
+    once they run over whole arrays.
+
+    :param x: uint64 array, one block per element
+    :param stages: subkey lists, one per DES stage(three for Triple DES)
+    :return: uint64 array of the output blocks
+    '''
+    SPs = _np_SP
+    x = IP_bits.apply_array(x)
+    L, R = x >> np.uint64(32), x & np.uint64(0xFFFFFFFF)
+    for j, subkey in enumerate(stages):
+        if j:
+            # FP followed by IP is the identity, only the swap remains
+            L, R = R, L
+        for k in subkey:
+            e = (R & np.uint64(1)) << np.uint64(33) | R << np.uint64(1) | R >> np.uint64(31)
+            f = 0
+            for i in range(8):
+                s = 28 - 4*i
+                f = f ^ SPs[i][((e >> np.uint64(s)) ^ np.uint64((k >> (42 - 6*i)) & 0x3F)) & np.uint64(0x3F)]
+            L, R = R, L ^ f
+    return FP_bits.apply_array(R << np.uint64(32) | L)
+
+def _crypt_blocks_numpy(buf, stages):
+    '''
+    `_crypt_array` over a buffer of whole 64-bit blocks
+
+    :rtype: bytearray
+    '''
+    x = np.frombuffer(buf, dtype='>u8').astype(np.uint64)
+    return bytearray(_crypt_array(x, stages).astype('>u8').tobytes())
+
+def DES_enc_int(m, subkey):
+    '''
+    Encryption of DES with the integer engine.
+
+    :param bytes m: The message to be encrypted.
+    :param list subkey: The integer subkeys from `gen_key_int`.
+    :return: The cipher after encryprtion.
+    :rtype: bytes
+    :raises TypeError: if the type of m is not `bytes`.
+    :raises ValueError: if message is not 8-byte in length.
+    '''
+    if type(m) != bytes:
+        raise TypeError("message must be type `bytes`")
+    elif len(m) != 8:
+        raise ValueError("message must be 64-bit in length")
+    return DES_crypt_int(int.from_bytes(m, 'big'), subkey).to_bytes(8, 'big')
+
+def DES_dec_int(c, subkey):
+    '''
+    Decryption of DES with the integer engine.
+
+    :param bytes c: The cipher to be decrypted
+    :param list subkey: The integer subkeys from `gen_key_int`
+    :return: the message after decryption
+    :rtype: bytes
+    :raises TypeError: if the type of c is not `bytes`
+    :raises ValueError: if cipher is not 8-byte in length
+    '''
+    return DES_enc_int(c, subkey[::-1])
+
+def gen_key_int(key):
+    '''
+    Generate the sixteen subkeys as 48-bit integers.
+
+    :param bytes key: The key to generate sixteen subkeys
+    :return: the sixteen subkeys, shared through the cache and not to be modified
+    :rtype: list
+    :raises TypeError: if the type of key is not `bytes`
+    :raises ValueError: if @key is not 56-bit or 64-bit in length
+    '''
+    if type(key) != bytes:
+        raise TypeError("key must be type `bytes`")
+    if len(key) not in (7, 8):
+        raise ValueError("key must be 56-bit or 64-bit in length")
+    return key_schedule_cache.get("DES-int", key, lambda: _expand_key_int(key))
+
+def _expand_key_int(key):
+    '''
+    The key schedule behind `gen_key_int`.
+    '''
+    k = int.from_bytes(key, 'big')
+    if len(key) == 8:
+        # PC-1
+        k = PC_1_perm(k)
+    Ci, Di = k >> 28, k & 0xFFFFFFF
+    subkey = []
+    for i in range(16):
+        # Left Rotation, 1 position if i = 1, 2, 9, 16 and 2 positions otherwise
+        s = 1 if i + 1 in (1, 2, 9, 16) else 2
+        Ci = (Ci << s | Ci >> (28 - s)) & 0xFFFFFFF
+        Di = (Di << s | Di >> (28 - s)) & 0xFFFFFFF
+        # PC-2
+        subkey.append(PC_2_perm(Ci << 28 | Di))
+    return subkey
+
+
+
+'''Block cipher objects'''
+class DES(object):
+    '''
+    Single DES as a block cipher object over the integer engine.
+
+    Works with the modes in `AES_modes`, e.g. `CBCMode(DES(key), IV)`.
+    '''
+    block_size = 8
+    # minimum number of blocks for `encrypt_blocks` / `decrypt_blocks` to use NumPy
+    numpy_threshold = 64
+
+    def __init__(self, key):
+        '''
+        :param bytes key: 8-byte key(or 7 bytes without the parity bits)
+        :raises TypeError: if the type of key is not `bytes`
+        :raises ValueError: if key is not 56-bit or 64-bit in length
+        '''
+        if type(key) != bytes:
+            raise TypeError("key must be type `bytes`")
+        if len(key) not in (7, 8):
+            raise ValueError("key must be 56-bit or 64-bit in length")
+        # cached apart from `gen_key_int`, so that evicting this key wipes exactly these lists
+        self._ek, self._dk = key_schedule_cache.get("DES-obj", key, lambda: DES._schedule(key))
+
+    @staticmethod
+    def _schedule(key):
+        '''
+        Subkeys for encryption and, reversed, for decryption
+        '''
+        subkey = _expand_key_int(key)
+        return [subkey, subkey[::-1]]
+
+    def encrypt(self, m):
+        '''
+        Encrypt a 64-bit block.
+
+        :param bytes m: The message to be encrypted.
+        :rtype: bytes
+        :raises TypeError: if the type of m is not `bytes`.
+        :raises ValueError: if message is not 8-byte in length.
+        '''
+        return DES_enc_int(m, self._ek)
+
+    def decrypt(self, c):
+        '''
+        Decrypt a 64-bit block.
+
+        :param bytes c: The cipher to be decrypted.
+        :rtype: bytes
+        :raises TypeError: if the type of c is not `bytes`.
+        :raises ValueError: if cipher is not 8-byte in length.
+        '''
+        return DES_enc_int(c, self._dk)
+
+    def encrypt_blocks(self, buf):
+        '''
+        Encrypt a buffer of whole 64-bit blocks.
+
+        :param bytes-like buf: multiple of 8 bytes in length
+        :rtype: bytearray
+        '''
+        return self._crypt_blocks(buf, self._ek)
+
+    def decrypt_blocks(self, buf):
+        '''
+        Decrypt a buffer of whole 64-bit blocks.
+
+        :param bytes-like buf: multiple of 8 bytes in length
+        :rtype: bytearray
+        '''
+        return self._crypt_blocks(buf, self._dk)
+
+    @staticmethod
+    def _crypt_blocks(buf, subkey):
+        buf = memoryview(buf).cast('B')
+        if len(buf) % 8 != 0:
+            raise ValueError("The length of data must be the mutiple of 8")
+        if np is not None and len(buf) >= 8*DES.numpy_threshold:
+            return _crypt_blocks_numpy(buf, (subkey,))
+        out = bytearray(len(buf))
+        for i in range(0, len(buf), 8):
+            out[i:i+8] = DES_crypt_int(int.from_bytes(buf[i:i+8], 'big'), subkey).to_bytes(8, 'big')
+        return out
+
+
+'''Triple DES'''
+class TripleDES(object):
+    '''
+    Triple DES in EDE form, C = E_K3(D_K2(E_K1(P))).
+
+    The three DES operations run as one pipeline: the FP of one stage and
+    the IP of the next cancel out, so the 48 rounds sit between a single IP
+    and a single FP with only a swap of the halves between stages.
+    Works with the modes in `AES_modes`, e.g. `CBCMode(TripleDES(key), IV)`.
+    '''
+    block_size = 8
+    # minimum number of blocks for `encrypt_blocks` / `decrypt_blocks` to use NumPy
+    numpy_threshold = 64
+
+    def __init__(self, key):
+        '''
+        :param bytes key: 16 bytes for EDE2 (K3 = K1) or 24 bytes for EDE3
+        :raises TypeError: if the type of key is not `bytes`
+        :raises ValueError: if key is not 128-bit or 192-bit in length
+        '''
+        if type(key) != bytes:
+            raise TypeError("key must be type `bytes`")
+        if len(key) not in (16, 24):
+            raise ValueError("key must be 128-bit(EDE2) or 192-bit(EDE3) in length")
+        self._ek, self._dk = key_schedule_cache.get("3DES", key, lambda: TripleDES._schedule(key))
+
+    @staticmethod
+    def _schedule(key):
+        '''
+        Subkeys of the three stages for encryption and for decryption, the
+        decryption stage of each direction takes them reversed
+        '''
+        k1, k2 = _expand_key_int(key[:8]), _expand_key_int(key[8:16])
+        k3 = _expand_key_int(key[16:]) if len(key) == 24 else k1
+        return [[k1, k2[::-1], k3], [k3[::-1], k2, k1[::-1]]]
+
+    def encrypt(self, m):
+        '''
+        Encrypt a 64-bit block.
+
+        :param bytes m: The message to be encrypted.
+        :rtype: bytes
+        :raises TypeError: if the type of m is not `bytes`.
+        :raises ValueError: if message is not 8-byte in length.
+        '''
+        return self._crypt(m, self._ek)
+
+    def decrypt(self, c):
+        '''
+        Decrypt a 64-bit block.
+
+        :param bytes c: The cipher to be decrypted.
+        :rtype: bytes
+        :raises TypeError: if the type of c is not `bytes`.
+        :raises ValueError: if cipher is not 8-byte in length.
+        '''
+        return self._crypt(c, self._dk)
+
+    def encrypt_blocks(self, buf):
+        '''
+        Encrypt a buffer of whole 64-bit blocks.
+
+        :param bytes-like buf: multiple of 8 bytes in length
+        :rtype: bytearray
+        '''
+        return self._crypt_blocks(buf, self._ek)
+
+    def decrypt_blocks(self, buf):
+        '''
+        Decrypt a buffer of whole 64-bit blocks.
+
+        :param bytes-like buf: multiple of 8 bytes in length
+        :rtype: bytearray
+        '''
+        return self._crypt_blocks(buf, self._dk)
+
+    @staticmethod
+    def _crypt(b, keys):
+        if type(b) != bytes:
+            raise TypeError("block must be type `bytes`")
+        elif len(b) != 8:
+            raise ValueError("block must be 64-bit in length")
+        return TripleDES._crypt_int(int.from_bytes(b, 'big'), keys).to_bytes(8, 'big')
+
+    @staticmethod
+    def _crypt_int(x, keys):
+        k1, k2, k3 = keys
+        x = IP_perm(x)
+        L, R = _rounds(x >> 32, x & 0xFFFFFFFF, k1)
+        # FP followed by IP is the identity, only the swap remains
+        L, R = _rounds(R, L, k2)
+        L, R = _rounds(R, L, k3)
+        return FP_perm(R << 32 | L)
+
+    @staticmethod
+    def _crypt_blocks(buf, keys):
+        buf = memoryview(buf).cast('B')
+        if len(buf) % 8 != 0:
+            raise ValueError("The length of data must be the mutiple of 8")
+        if np is not None and len(buf) >= 8*TripleDES.numpy_threshold:
+            return _crypt_blocks_numpy(buf, keys)
+        out = bytearray(len(buf))
+        crypt = TripleDES._crypt_int
+        for i in range(0, len(buf), 8):
+            out[i:i+8] = crypt(int.from_bytes(buf[i:i+8], 'big'), keys).to_bytes(8, 'big')
+        return out
+
+
+
 '''Test'''
 def test():
     m = b"desisbad"
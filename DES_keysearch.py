@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+'''
+Exhaustive key search for DES with known plaintext/ciphertext pairs.
+
+Candidate keys are evaluated many at a time in bitsliced form: every bit of
+the DES state is a Python integer whose j-th bit belongs to the j-th key
+(lane) of the batch, so each boolean operation runs the round function for
+all lanes at once. The S-boxes are built from their 64 minterms and the key
+bits are routed straight into the rounds through PC-1, the shifts and PC-2,
+there is no per-key key schedule.
+
+A batch only runs 15 rounds: R15 becomes L16, the right half of
+IP(ciphertext), so comparing it rules out all but about 2^-32 of the
+wrong keys. The survivors are checked with `DES_enc_int`
+against all the pairs.
+'''
+
+from DES import Expansion_table, IP_table, PC_1_table, PC_2_table, Permutation_table, sbox
+from DES import DES_enc_int, gen_key_int
+from Utility import PermuteInt
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import os
+
+
+'''Key space'''
+class KeySpace(object):
+    '''
+    The DES keys that agree with `base` outside of `mask`.
+
+    The unknown bits are numbered from the least significant one, and the
+    i-th candidate(0 <= i < 2**n for n unknown bits) takes the bits of i on
+    them. Parity bits(the lowest bit of each byte) are ignored by DES, so they
+    are dropped from the mask.
+    '''
+    def __init__(self, base=bytes(8), mask=b'\xff'*8, start=0, stop=None):
+        '''
+        :param bytes base: 8-byte key with the known bits
+        :param bytes mask: 8 bytes, set bits are unknown
+        :param int start: index of the first candidate
+        :param int stop: index after the last candidate(default all)
+        '''
+        if type(base) != bytes or type(mask) != bytes:
+            raise TypeError("base and mask must be type `bytes`")
+        if len(base) != 8 or len(mask) != 8:
+            raise ValueError("base and mask must be 64-bit in length")
+        self.base = int.from_bytes(base, 'big')
+        mask = int.from_bytes(mask, 'big') & 0xFEFEFEFEFEFEFEFE
+        # DES bit positions(0 is the most significant) of the unknown bits, lowest first
+        self.bits = [p for p in range(63, -1, -1) if mask >> (63 - p) & 1]
+        self.base &= ~mask
+        size = 1 << len(self.bits)
+        self.start = start
+        self.stop = size if stop is None else stop
+        if not 0 <= self.start <= self.stop <= size:
+            raise ValueError("range out of the key space")
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def key(self, i):
+        '''
+        The i-th candidate key
+
+        :rtype: bytes
+        '''
+        k = self.base
+        for t, p in enumerate(self.bits):
+            if i >> t & 1:
+                k |= 1 << (63 - p)
+        return k.to_bytes(8, 'big')
+
+
+'''Bitsliced DES'''
+def _subkey_bits():
+    '''
+    For every round, the key bit position(0 ~ 63) behind each of the 48 subkey bits
+    '''
+    rounds = []
+    s = 0
+    for i in range(16):
+        s += 1 if i + 1 in (1, 2, 9, 16) else 2
+        # CiDi as positions of C0D0
+        CD = [(q + s) % 28 for q in range(28)] + [28 + (q + s) % 28 for q in range(28)]
+        rounds.append([PC_1_table[CD[PC_2_table[j] - 1]] - 1 for j in range(48)])
+    return rounds
+
+def _sbox_ones(i):
+    '''
+    For each of the four output bits of S-box i, the 6-bit inputs that set it
+    '''
+    ones = [[], [], [], []]
+    for v in range(64):
+        s = sbox[i][16 * ((v >> 5) << 1 | v & 1) + (v >> 1 & 0xF)]
+        for t in range(4):
+            if s >> (3 - t) & 1:
+                ones[t].append(v)
+    return ones
+
+SUBKEY_BITS = _subkey_bits()
+SBOX_ONES = [_sbox_ones(i) for i in range(8)]
+# S-box output bit -> bit of the F-function output
+P_INV = [Permutation_table.index(s + 1) for s in range(32)]
+E_INDEX = [e - 1 for e in Expansion_table]
+
+def sliced_sbox(i, x, M):
+    '''
+    S-box i on bitsliced inputs
+
+    :param int i: index of the S-box
+    :param list x: six lanes, the most significant input bit first
+    :param int M: mask of all the lanes
+    :return: the four output lanes, most significant first
+    :rtype: list
+    '''
+    a, b, c, d, e, f = x
+    na, nb, nc, nd, ne, nf = a ^ M, b ^ M, c ^ M, d ^ M, e ^ M, f ^ M
+    # minterms of the three high and the three low inputs, then of all six
+    hi = [p & q for p in (na & nb, na & b, a & nb, a & b) for q in (nc, c)]
+    lo = [p & q for p in (nd & ne, nd & e, d & ne, d & e) for q in (nf, f)]
+    m = [h & l for h in hi for l in lo]
+    out = []
+    for ones in SBOX_ONES[i]:
+        o = 0
+        for v in ones:
+            o |= m[v]
+        out.append(o)
+    return out
+
+def sliced_rounds(L, R, K, M, n=16):
+    '''
+    The first n rounds of DES on bitsliced halves
+
+    :param list L: 32 lanes of the left half, the most significant bit first
+    :param list R: 32 lanes of the right half
+    :param list K: 64 lanes of the key, by DES bit position
+    :param int M: mask of all the lanes
+    :return: the halves (L, R) after n rounds
+    '''
+    for r in range(n):
+        k = [K[p] for p in SUBKEY_BITS[r]]
+        x = [R[E_INDEX[j]] ^ k[j] for j in range(48)]
+        f = [0] * 32
+        for i in range(8):
+            for t, o in enumerate(sliced_sbox(i, x[6*i:6*i+6], M)):
+                f[P_INV[4*i + t]] = o
+        L, R = R, [L[j] ^ f[j] for j in range(32)]
+    return L, R
+
+def lane_pattern(t, lanes):
+    '''
+    The lane mask whose j-th bit is the t-th bit of j
+
+    :param int t: bit of the lane index
+    :param int lanes: number of lanes, a power of 2
+    '''
+    half = 1 << t
+    period = half << 1
+    # one period of the pattern repeated over all the lanes
+    return ((1 << half) - 1 << half) * (((1 << lanes) - 1) // ((1 << period) - 1))
+
+
+'''Search'''
+def _check(pairs, key):
+    '''
+    Whether `key` maps every plaintext to its ciphertext
+    '''
+    subkey = gen_key_int(key)
+    return all(DES_enc_int(p, subkey) == c for p, c in pairs)
+
+def search_range(pairs, space, lo, hi, lanes=1 << 16):
+    '''
+    Search the candidates lo ~ hi-1 of `space` in this process.
+
+    :param list pairs: known (plaintext, ciphertext) pairs of 8-byte blocks
+    :param KeySpace space: the key space
+    :param int lo: first candidate index
+    :param int hi: index after the last candidate
+    :param int lanes: keys per bitsliced batch, a power of 2
+    :return: the keys found
+    :rtype: list
+    '''
+    if lo >= hi:
+        return []
+    b = min(lanes.bit_length() - 1, len(space.bits))
+    lanes = 1 << b
+    M = (1 << lanes) - 1
+    x = PermuteInt(int.from_bytes(pairs[0][0], 'big'), IP_table, 64)
+    L0 = [M if x >> (63 - j) & 1 else 0 for j in range(32)]
+    R0 = [M if x >> (31 - j) & 1 else 0 for j in range(32)]
+    # R15 shows up as the right half of the preoutput, IP(ciphertext) = R16 L16
+    y = PermuteInt(int.from_bytes(pairs[0][1], 'big'), IP_table, 64)
+    target = [M if y >> (31 - j) & 1 else 0 for j in range(32)]
+
+    K = [M if space.base >> (63 - p) & 1 else 0 for p in range(64)]
+    for t in range(b):
+        K[space.bits[t]] = lane_pattern(t, lanes)
+    upper = space.bits[b:]
+
+    found = []
+    for batch in range(lo >> b, (hi - 1 >> b) + 1):
+        for t, p in enumerate(upper):
+            K[p] = M if batch >> t & 1 else 0
+        L, R = sliced_rounds(L0, R0, K, M, 15)
+        diff = 0
+        for j in range(32):
+            diff |= R[j] ^ target[j]
+        # lanes of this batch inside lo ~ hi-1
+        first = batch << b
+        valid = (M >> max(0, first + lanes - hi)) & (M << max(0, lo - first)) & M
+        hits = ~diff & valid
+        while hits:
+            j = (hits & -hits).bit_length() - 1
+            hits &= hits - 1
+            key = space.key(first + j)
+            if _check(pairs, key):
+                found.append(key)
+    return found
+
+def search(pairs, space, workers=1, lanes=1 << 16, chunk=1 << 20, progress=None, cancel=None, find_all=False):
+    '''
+    Search `space` for the DES keys matching all the known pairs.
+
+    :param list pairs: known (plaintext, ciphertext) pairs of 8-byte blocks
+    :param KeySpace space: the key space
+    :param int workers: number of worker processes(default 1), None for `os.cpu_count()`
+    :param int lanes: keys per bitsliced batch, a power of 2
+    :param int chunk: candidates per task, rounded to a multiple of `lanes`
+    :param progress: called as `progress(done, total)` after each task
+    :param cancel: object with `is_set()`(e.g. `threading.Event`), checked between tasks
+    :param bool find_all: keep searching after the first key is found
+    :return: the keys found
+    :rtype: list
+    :raises ValueError: if there is no pair or a block is not 64-bit in length
+    '''
+    pairs = [(bytes(p), bytes(c)) for p, c in pairs]
+    if not pairs:
+        raise ValueError("at least one plaintext/ciphertext pair is needed")
+    if any(len(p) != 8 or len(c) != 8 for p, c in pairs):
+        raise ValueError("blocks must be 64-bit in length")
+    if lanes < 1 or lanes & (lanes - 1):
+        raise ValueError("lanes must be a power of 2")
+    chunk = max(lanes, chunk - chunk % lanes)
+    total = len(space)
+    # tasks split on multiples of `chunk`, so they start on batch boundaries
+    bounds = [space.start] + list(range(space.start - space.start % chunk + chunk, space.stop, chunk)) + [space.stop]
+    tasks = iter(zip(bounds, bounds[1:]))
+
+    found = []
+    done = 0
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for lo, hi in tasks:
+            if cancel is not None and cancel.is_set():
+                break
+            found += search_range(pairs, space, lo, hi, lanes)
+            done += hi - lo
+            if progress is not None:
+                progress(done, total)
+            if found and not find_all:
+                break
+        return found
+
+    pool = ProcessPoolExecutor(workers)
+    pending = {}
+    try:
+        while True:
+            # keep a couple of tasks queued per worker
+            while len(pending) < 2 * workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending[pool.submit(search_range, pairs, space, task[0], task[1], lanes)] = task
+            if not pending:
+                break
+            finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                lo, hi = pending.pop(fut)
+                found += fut.result()
+                done += hi - lo
+                if progress is not None:
+                    progress(done, total)
+            if (found and not find_all) or (cancel is not None and cancel.is_set()):
+                break
+    finally:
+        # return without waiting for the queued tasks once a key is found or the search is cancelled,
+        # the tasks already running finish in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+    return found
+
+
+
+'''Test'''
+def test():
+    import time
+    key = bytes.fromhex("133457799BBCDFF1")
+    pairs = [(m, DES_enc_int(m, gen_key_int(key))) for m in (b"desisbad", b"Imnotkey")]
+    # the low 21 effective bits are unknown
+    space = KeySpace(key, bytes.fromhex("0000000000fefefe"))
+    start = time.time()
+    found = search(pairs, space, progress=lambda done, total: print(f"\r{done}/{total}", end=""))
+    print()
+    print("Key:", [k.hex() for k in found])
+    print(f"Time: {time.time() - start:.2f}s")
+    # the key is candidate 120 of its low byte, a range inside one batch that stops just before it
+    space = KeySpace(key, bytes.fromhex("00000000000000fe"), 117, 120)
+    print("Key in [117, 120):", search(pairs, space, lanes=128))
+    space = KeySpace(key, bytes.fromhex("00000000000000fe"), 117, 121)
+    print("Key in [117, 121):", [k.hex() for k in search(pairs, space, lanes=128)])
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+HMAC and HKDF over the SHA-1 and SM3 implementations.
+"""
+
+# Reference: https://tools.ietf.org/html/rfc2104, https://tools.ietf.org/html/rfc5869
+
+import hmac
+
+from SHA1 import SHA1
+from SM3 import SM3
+
+__all__ = [
+    'HMAC', 'hmac_sha1', 'hmac_sm3', 'hkdf_extract', 'hkdf_expand', 'hkdf'
+]
+
+
+class HMAC(object):
+    def __init__(self, key, m=None, digestmod=SHA1):
+        """Returns a HMAC object; optionally initialized with some bytes.
+
+        The key padded with ipad and with opad is compressed once, here;
+        `copy()`, `sign()` and `verify()` start from those two states, so
+        a message costs its own blocks plus one outer block.
+
+        Args:
+            key (bytes): bytes-like secret key
+            m (bytes, optional): bytes-like object to initialize the HMAC
+                object. Defaults to None.
+            digestmod (class, optional): hash class with `copy()`,
+                `digest_size` and `block_size`, e.g. SHA1 or SM3.
+                Defaults to SHA1.
+
+        Raises:
+            TypeError: key is not a bytes-like object
+        """
+        try:
+            key = bytes(memoryview(key))
+        except TypeError:
+            raise TypeError(f"a bytes-like object is required, not '{type(key)}'") from None
+        self.digestmod = digestmod
+        self.digest_size = digestmod.digest_size
+        self.block_size = digestmod.block_size
+        self.name = "hmac-" + digestmod.name
+        # keys longer than a block are hashed first
+        if len(key) > self.block_size:
+            key = digestmod(key).digest()
+        k = int.from_bytes(key.ljust(self.block_size, b"\x00"), 'big')
+        self._inner = digestmod((k ^ int.from_bytes(b"\x36" * self.block_size, 'big')).to_bytes(self.block_size, 'big'))
+        self._outer = digestmod((k ^ int.from_bytes(b"\x5c" * self.block_size, 'big')).to_bytes(self.block_size, 'big'))
+        self._h = self._inner.copy()
+        if m is not None:
+            self.update(m)
+
+    def update(self, m):
+        """Update this HMAC object's state with the provided bytes.
+
+        Args:
+            m (bytes): bytes-like object to update the HMAC object.
+        """
+        self._h.update(m)
+
+    def digest(self):
+        """Return the MAC value as a bytes object.
+
+        The HMAC object is left unchanged, so it can be updated further.
+        """
+        outer = self._outer.copy()
+        outer.update(self._h.digest())
+        return outer.digest()
+
+    def hexdigest(self):
+        """Return the MAC value as a string of hexadecimal digits.
+        """
+        return self.digest().hex()
+
+    def copy(self):
+        """Return a copy ("clone") of the HMAC object.
+
+        Returns:
+            HMAC: an independent HMAC object with the same state
+        """
+        h = HMAC.__new__(HMAC)
+        h.__dict__.update(self.__dict__)
+        h._h = self._h.copy()
+        return h
+
+    def sign(self, m):
+        """Return the MAC value of `m` alone, from the precomputed key states.
+
+        Neither the data given to `update()` nor the state of this HMAC
+        object is involved, so one object per key can sign any number of
+        messages.
+
+        Args:
+            m (bytes): bytes-like message
+
+        Returns:
+            bytes: the MAC value
+        """
+        inner = self._inner.copy()
+        inner.update(m)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def verify(self, m, tag):
+        """Check the MAC value of `m` in constant time.
+
+        Args:
+            m (bytes): bytes-like message
+            tag (bytes): the MAC value to check
+
+        Returns:
+            bool: whether `tag` is the MAC value of `m`
+        """
+        return hmac.compare_digest(self.sign(m), bytes(tag))
+
+
+def hmac_sha1(key, m):
+    """HMAC-SHA1 of `m` under `key`.
+    """
+    return HMAC(key, m, SHA1).digest()
+
+
+def hmac_sm3(key, m):
+    """HMAC-SM3 of `m` under `key`.
+    """
+    return HMAC(key, m, SM3).digest()
+
+
+def hkdf_extract(salt, ikm, digestmod=SHA1):
+    """HKDF-Extract, the pseudorandom key from the input keying material.
+
+    Args:
+        salt (bytes): optional salt, b"" for a string of zeros
+        ikm (bytes): input keying material
+        digestmod (class, optional): SHA1 or SM3. Defaults to SHA1.
+
+    Returns:
+        bytes: the pseudorandom key (digest_size bytes)
+    """
+    if not salt:
+        salt = bytes(digestmod.digest_size)
+    return HMAC(salt, ikm, digestmod).digest()
+
+
+def hkdf_expand(prk, info=b"", length=None, digestmod=SHA1):
+    """HKDF-Expand, `length` bytes of output keying material.
+
+    Args:
+        prk (bytes): pseudorandom key, at least digest_size bytes
+        info (bytes, optional): context information. Defaults to b"".
+        length (int, optional): length of the output. Defaults to
+            digest_size.
+        digestmod (class, optional): SHA1 or SM3. Defaults to SHA1.
+
+    Returns:
+        bytes: the output keying material
+
+    Raises:
+        ValueError: length is more than 255 * digest_size
+    """
+    if length is None:
+        length = digestmod.digest_size
+    if not 0 <= length <= 255 * digestmod.digest_size:
+        raise ValueError(f"length must be at most {255 * digestmod.digest_size}")
+    # the key states of prk are compressed once for all the blocks
+    mac = HMAC(prk, digestmod=digestmod)
+    okm = b""
+    t = b""
+    i = 1
+    while len(okm) < length:
+        t = mac.sign(t + info + bytes([i]))
+        okm += t
+        i += 1
+    return okm[:length]
+
+
+def hkdf(ikm, length, salt=b"", info=b"", digestmod=SHA1):
+    """HKDF, extract then expand.
+
+    Args:
+        ikm (bytes): input keying material
+        length (int): length of the output
+        salt (bytes, optional): Defaults to b"".
+        info (bytes, optional): Defaults to b"".
+        digestmod (class, optional): SHA1 or SM3. Defaults to SHA1.
+
+    Returns:
+        bytes: the output keying material
+    """
+    return hkdf_expand(hkdf_extract(salt, ikm, digestmod), info, length, digestmod)
+
+
+def test1():
+    print(f"HMAC-SHA1(b'key', b'The quick brown fox jumps over the lazy dog'): "
+          f"{hmac_sha1(b'key', b'The quick brown fox jumps over the lazy dog').hex()}")
+    # de7c9b85b8b78aa6bc8a7a36f70a90701c9db4d9
+
+
+def test2():
+    okm = hkdf(b"\x0b" * 11, 42, bytes(range(13)), bytes(range(0xf0, 0xfa)))
+    print(f"HKDF-SHA1 (RFC 5869 test case 4): {okm.hex()}")
+    # 085a01ea1b10f36933068b56efa5ad81a4f14b822f5b091568a9cdd4f155fda2c22e422478d305f3f896
+
+
+if __name__ == "__main__":
+    test1()
+    test2()
@@ -7,6 +7,13 @@ SHA-1 Hash Function Implementation.
 
 # Reference: https://zh.wikipedia.org/wiki/SHA-1
 
+import struct
+
+try:
+    import numpy as np  # optional, accelerates `SHA1.hash_many`
+except ImportError:
+    np = None
+
 __all__ = [
     'SHA1'
 ]
@@ -24,57 +31,113 @@ class SHA1(object):
             TypeError: m is not a bytes-like object
         """
         self._V = SHA1._IV.copy()       # V: 256-bit states
-        self._m = m                     # uncompressed bytes
-        self._length = len(self._m)     # total length
+        self._m = bytearray()           # uncompressed bytes (< 512-bit)
+        self._length = 0                # total length
         self._h0, self._h1, self._h2, self._h3, self._h4 = self._IV
         # no initialization value
         if m is None:
             return
         # given initialization value
-        if not isinstance(m, (bytes, bytearray)):
-            raise TypeError(f"a bytes-like object is required, not '{type(m)}'")
-        # compress those already fill in a 512-bit block.
-        for i in range(len(m)//64):
-            self._one_block(m[i*64:(i+1)*64])
-        # record the left uncompressed bytes (< 512-bit)
-        left_length = len(m) % 64
-        if left_length > 0:
-            self._m = m[-left_length:]
-        else:
-            self._m = b""
+        self.update(m)
 
     def update(self, m):
         """Update this hash object's state with the provided bytes.
 
+        Full blocks are compressed straight from a memoryview of `m`,
+        only the last (< 512-bit) bytes are copied and kept.
+
         Args:
-            m (bytes): bytes-like object to update the hash object.
+            m (bytes): bytes-like object to update the hash object, any
+                object supporting the buffer protocol (e.g. mmap).
+
+        Raises:
+            TypeError: m is not a bytes-like object
         """
-        self._m += m
-        self._length += len(m)
-        # compress those which can already fill in 512-bit block.
-        for i in range(len(self._m) // 64):
-            self._V = self._one_block(self._m[i*64:(i+1)*64])
-        # record the left bytes (< 512-bit)
-        left_length = len(self._m) % 64
-        if left_length > 0:
-            self._m = self._m[-left_length:]
-        else:
-            self._m = b""
+        try:
+            view = memoryview(m)
+        except TypeError:
+            raise TypeError(f"a bytes-like object is required, not '{type(m)}'") from None
+        with view, view.cast('B') as data:
+            n = len(data)
+            self._length += n
+            i = 0
+            # complete the block left from the last update first
+            if self._m:
+                i = min(64 - len(self._m), n)
+                self._m += data[:i]
+                if len(self._m) < 64:
+                    return
+                self._one_block(self._m)
+                self._m = bytearray()
+            # compress those which can already fill in 512-bit block.
+            end = i + (n - i) // 64 * 64
+            for i in range(i, end, 64):
+                self._one_block(data[i:i+64])
+            # record the left bytes (< 512-bit)
+            self._m += data[end:]
 
     def digest(self):
         """Return the digest value as a bytes object.
+
+        The hash object is left unchanged, so it can be updated further.
         """
-        padded = SHA1._pad(self._m, self._length)
+        h = self.copy()
+        padded = SHA1._pad(h._m, h._length)
         for i in range(len(padded)//64):
-            self._one_block(padded[i*64:(i+1)*64])
+            h._one_block(padded[i*64:(i+1)*64])
         checksum = b""
-        checksum += SHA1._word_to_bytes(self._h0)
-        checksum += SHA1._word_to_bytes(self._h1)
-        checksum += SHA1._word_to_bytes(self._h2)
-        checksum += SHA1._word_to_bytes(self._h3)
-        checksum += SHA1._word_to_bytes(self._h4)
+        checksum += SHA1._word_to_bytes(h._h0)
+        checksum += SHA1._word_to_bytes(h._h1)
+        checksum += SHA1._word_to_bytes(h._h2)
+        checksum += SHA1._word_to_bytes(h._h3)
+        checksum += SHA1._word_to_bytes(h._h4)
         return checksum
 
+    def copy(self):
+        """Return a copy ("clone") of the hash object.
+
+        Returns:
+            SHA1: an independent hash object with the same state
+        """
+        h = SHA1.__new__(SHA1)
+        h._V = self._V.copy()
+        h._m = bytearray(self._m)
+        h._length = self._length
+        h._h0, h._h1, h._h2, h._h3, h._h4 = self._h0, self._h1, self._h2, self._h3, self._h4
+        return h
+
+    def midstate(self):
+        """Export the internal state, to resume hashing later with `from_midstate`.
+
+        Returns:
+            bytes: 160-bit chaining value, 64-bit total length and the
+                uncompressed bytes (< 512-bit)
+        """
+        words = (self._h0, self._h1, self._h2, self._h3, self._h4)
+        return b"".join(SHA1._word_to_bytes(w) for w in words) + self._length.to_bytes(8, 'big') + bytes(self._m)
+
+    @staticmethod
+    def from_midstate(state):
+        """Restore a hash object from `midstate()`.
+
+        Args:
+            state (bytes): the exported state
+
+        Returns:
+            SHA1: the hash object
+
+        Raises:
+            ValueError: state is malformed
+        """
+        state = bytes(state)
+        if len(state) < 28 or len(state) != 28 + int.from_bytes(state[20:28], 'big') % 64:
+            raise ValueError("invalid SHA-1 midstate")
+        h = SHA1(None)
+        h._h0, h._h1, h._h2, h._h3, h._h4 = (SHA1._bytes_to_word(state[i:i+4]) for i in range(0, 20, 4))
+        h._length = int.from_bytes(state[20:28], 'big')
+        h._m = bytearray(state[28:])
+        return h
+
     def hexdigest(self):
         """Return the digest value as a string of hexadecimal digits.
         """
@@ -83,33 +146,31 @@ class SHA1(object):
     def _one_block(self, chunk):
         """Perform the one block compress function.
 
+        The message schedule is expanded up front and each of the four round
+        groups runs as its own loop, with the rotations inlined.
+
         Args:
             chunk (bytes): (512-bit bytes) block
         """
-        w = [0] * 80
-        for i in range(0, len(chunk), 4):
-            w[i//4] = SHA1._bytes_to_word(chunk[i:i+4])
+        w = list(struct.unpack(">16I", chunk))
         for i in range(16, 80):
-            w[i] = SHA1._left_rotate(w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16], 1)
+            x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]
+            w.append(((x << 1) | (x >> 31)) & 0xFFFFFFFF)
         a, b, c, d, e = self._h0, self._h1, self._h2, self._h3, self._h4
-        f, k = 0, 0
-
-        for i in range(80):
-            if 0 <= i <= 20:
-                f = (b & c) | ((b ^ 0xFFFFFFFF) & d)
-                k = 0x5A827999
-            if 20 <= i <= 40:
-                f = b ^ c ^ d
-                k = 0x6ED9EBA1
-            if 40 <= i <= 60:
-                f = (b & c) | (b & d) | (c & d)
-                k = 0x8F1BBCDC
-            if 60 <= i <= 80:
-                f = b ^ c ^ d
-                k = 0xCA62C1D6
-
-            temp = SHA1._u32(SHA1._left_rotate(a, 5) + f + e + k + w[i])
-            a, b, c, d, e = temp, a, SHA1._left_rotate(b, 30), c, d
+
+        # the bits of (a << 5) beyond 32 only carry upwards, the final mask drops them
+        for i in range(0, 20):
+            a, b, c, d, e = (((a << 5) | (a >> 27)) + (d ^ (b & (c ^ d))) + e + 0x5A827999 + w[i]) & 0xFFFFFFFF, \
+                a, ((b << 30) | (b >> 2)) & 0xFFFFFFFF, c, d
+        for i in range(20, 40):
+            a, b, c, d, e = (((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0x6ED9EBA1 + w[i]) & 0xFFFFFFFF, \
+                a, ((b << 30) | (b >> 2)) & 0xFFFFFFFF, c, d
+        for i in range(40, 60):
+            a, b, c, d, e = (((a << 5) | (a >> 27)) + ((b & c) | (d & (b | c))) + e + 0x8F1BBCDC + w[i]) & 0xFFFFFFFF, \
+                a, ((b << 30) | (b >> 2)) & 0xFFFFFFFF, c, d
+        for i in range(60, 80):
+            a, b, c, d, e = (((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0xCA62C1D6 + w[i]) & 0xFFFFFFFF, \
+                a, ((b << 30) | (b >> 2)) & 0xFFFFFFFF, c, d
 
         self._h0 = SHA1._u32(self._h0 + a)
         self._h1 = SHA1._u32(self._h1 + b)
@@ -117,6 +178,91 @@ class SHA1(object):
         self._h3 = SHA1._u32(self._h3 + d)
         self._h4 = SHA1._u32(self._h4 + e)
 
+    @staticmethod
+    def hash_many(messages, lanes=1 << 14):
+        """Return the SHA-1 digests of many messages at once.
+
+        With NumPy, messages of similar length are padded and compressed
+        together over uint32 arrays, one lane per message. The lanes are
+        sorted by block count and split into buckets whose messages are at
+        least half as long as the bucket's longest, so padding never more
+        than doubles the data, and a message that has run out of blocks
+        simply drops out of the active prefix. Without NumPy, or for
+        buckets of only a few messages(e.g. a single long one), each
+        message is hashed on its own.
+
+        Args:
+            messages (iterable): bytes-like objects
+            lanes (int, optional): messages compressed together at most.
+                Defaults to 1 << 14.
+
+        Returns:
+            list: the 20-byte digests, in the order of `messages`
+        """
+        # as bytes, so that the length counts bytes whatever the item size
+        messages = [bytes(memoryview(m).cast('B')) for m in messages]
+        if np is None or len(messages) < SHA1.numpy_threshold:
+            return [SHA1(m).digest() for m in messages]
+        digests = [None] * len(messages)
+        order = sorted(range(len(messages)), key=lambda i: -len(messages[i]))
+        buckets = []
+        for i in order:
+            nb = (len(messages[i]) + 8) // 64 + 1
+            if buckets and len(buckets[-1][1]) < lanes and 2 * nb > buckets[-1][0]:
+                buckets[-1][1].append(i)
+            else:
+                buckets.append((nb, [i]))
+        for nmax, index in buckets:
+            if len(index) < SHA1.numpy_threshold:
+                for i in index:
+                    digests[i] = SHA1(messages[i]).digest()
+                continue
+            padded = [SHA1._pad(messages[i], len(messages[i])) for i in index]
+            nblocks = np.array([len(b) // 64 for b in padded])
+            # one row of words per message, zero-filled behind the shorter ones
+            row = 64 * nmax
+            buf = bytearray(len(index) * row)
+            for r, b in enumerate(padded):
+                buf[r*row:r*row + len(b)] = b
+            words = np.frombuffer(buf, dtype=">u4").reshape(len(index), -1).astype(np.uint32)
+            H = np.array(SHA1._IV, dtype=np.uint32)[:, None].repeat(len(index), axis=1)
+            for j in range(nmax):
+                k = int(np.count_nonzero(nblocks > j))
+                H[:, :k] += SHA1._compress_lanes(H[:, :k], words[:k, 16*j:16*j + 16])
+            out = H.T.astype(">u4").tobytes()
+            for r, i in enumerate(index):
+                digests[i] = out[20*r:20*r + 20]
+        return digests
+
+    @staticmethod
+    def _compress_lanes(H, block):
+        """The compress function over NumPy lanes.
+
+        Args:
+            H (numpy.ndarray): (5, k) uint32 chaining values
+            block (numpy.ndarray): (k, 16) uint32 message words
+
+        Returns:
+            numpy.ndarray: (5, k) values to add to the chaining values
+        """
+        w = [block[:, i].copy() for i in range(16)]
+        for i in range(16, 80):
+            x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]
+            w.append((x << np.uint32(1)) | (x >> np.uint32(31)))
+        a, b, c, d, e = (H[i].copy() for i in range(5))
+        s5, s27, s30, s2 = np.uint32(5), np.uint32(27), np.uint32(30), np.uint32(2)
+        groups = (
+            (0, lambda b, c, d: d ^ (b & (c ^ d)), np.uint32(0x5A827999)),
+            (20, lambda b, c, d: b ^ c ^ d, np.uint32(0x6ED9EBA1)),
+            (40, lambda b, c, d: (b & c) | (d & (b | c)), np.uint32(0x8F1BBCDC)),
+            (60, lambda b, c, d: b ^ c ^ d, np.uint32(0xCA62C1D6)),
+        )
+        for first, f, k in groups:
+            for i in range(first, first + 20):
+                a, b, c, d, e = ((a << s5) | (a >> s27)) + f(b, c, d) + e + k + w[i], \
+                    a, (b << s30) | (b >> s2), c, d
+        return np.stack((a, b, c, d, e))
+
     @staticmethod
     def _pad(m, total_length):
         """Padding the left bytes up to 512-bit.
@@ -179,6 +325,14 @@ class SHA1(object):
         0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0
     ]
 
+    # hashlib-compatible attributes
+    name = "sha1"
+    digest_size = 20
+    block_size = 64
+
+    # minimum number of messages for `hash_many` to use NumPy
+    numpy_threshold = 32
+
 
 def test1():
     import hashlib
@@ -7,6 +7,8 @@ SM3 Hash Function Implementation.
 
 # Reference: http://www.sca.gov.cn/sca/xwdt/2010-12/17/1002389/files/302a3ada057c4a73830536d03e683110.pdf
 
+import struct
+
 __all__ = [
     'SM3'
 ]
@@ -23,68 +25,159 @@ class SM3():
             TypeError: m is not a bytes-like object
         """
         self._V = SM3._IV.copy()     # V: 256-bit states
-        self._m = m                  # uncompresed bytes
-        self._length = len(self._m)  # total length
+        self._m = bytearray()        # uncompresed bytes (< 512-bit)
+        self._length = 0             # total length
+        self._W = [0] * 68           # message expansion buffer, reused by every block
         # no initialization value
-        if m == None:
+        if m is None:
             return
         # given initialization value
-        if not isinstance(m, (bytes, bytearray)):
-            raise TypeError(f"a bytes-like object is required, not '{type(m)}'")
-        # compress those already fill in a 512-bit block.
-        for i in range(len(m) // 64):
-            self._V = SM3._one_block(self._V, m[i*64:(i+1)*64])
-        # record the left uncompressed bytes (< 512-bit)
-        left_length = len(m) % 64
-        if left_length > 0:
-            self._m = m[-left_length:]
-        else:
-            self._m = b""
+        self.update(m)
 
     def update(self, m):
         """Update this hash object's state with the provided bytes.
 
+        Full blocks are compressed straight from a memoryview of `m`,
+        only the last (< 512-bit) bytes are copied and kept.
+
         Args:
-            m (bytes): bytes-like object to update the hash object.
+            m (bytes): bytes-like object to update the hash object, any
+                object supporting the buffer protocol (e.g. mmap).
+
+        Raises:
+            TypeError: m is not a bytes-like object
         """
-        self._m += m
-        self._length += len(m)
-        # compress those which can already fill in 512-bit block.
-        for i in range(len(self._m) // 64):
-            self._V = SM3._one_block(self._V, self._m[i*64:(i+1)*64])
-        # record the left bytes (< 512-bit)
-        left_length = len(self._m) % 64
-        if left_length > 0:
-            self._m = self._m[-left_length:]
-        else:
-            self._m = b""
+        try:
+            view = memoryview(m)
+        except TypeError:
+            raise TypeError(f"a bytes-like object is required, not '{type(m)}'") from None
+        with view, view.cast('B') as data:
+            n = len(data)
+            self._length += n
+            i = 0
+            # complete the block left from the last update first
+            if self._m:
+                i = min(64 - len(self._m), n)
+                self._m += data[:i]
+                if len(self._m) < 64:
+                    return
+                self._V = SM3._one_block(self._V, self._m, self._W)
+                self._m = bytearray()
+            # compress those which can already fill in 512-bit block.
+            end = i + (n - i) // 64 * 64
+            for i in range(i, end, 64):
+                self._V = SM3._one_block(self._V, data[i:i+64], self._W)
+            # record the left bytes (< 512-bit)
+            self._m += data[end:]
 
     def digest(self):
         """Return the digest value as a bytes object.
+
+        The hash object is left unchanged, so it can be updated further.
         """
+        V = self._V
         padded = SM3._pad(self._m, self._length)
         for i in range(len(padded)//64):
-            V = SM3._one_block(self._V, padded[i*64:(i+1)*64])
+            V = SM3._one_block(V, padded[i*64:(i+1)*64], self._W)
         return SM3._words_to_bytes(V)
 
+    def copy(self):
+        """Return a copy ("clone") of the hash object.
+
+        Returns:
+            SM3: an independent hash object with the same state
+        """
+        h = SM3.__new__(SM3)
+        h._V = self._V.copy()
+        h._m = bytearray(self._m)
+        h._length = self._length
+        h._W = [0] * 68
+        return h
+
+    def midstate(self):
+        """Export the internal state, to resume hashing later with `from_midstate`.
+
+        Returns:
+            bytes: 256-bit chaining value, 64-bit total length and the
+                uncompressed bytes (< 512-bit)
+        """
+        return SM3._words_to_bytes(self._V) + self._length.to_bytes(8, 'big') + bytes(self._m)
+
+    @staticmethod
+    def from_midstate(state):
+        """Restore a hash object from `midstate()`.
+
+        Args:
+            state (bytes): the exported state
+
+        Returns:
+            SM3: the hash object
+
+        Raises:
+            ValueError: state is malformed
+        """
+        state = bytes(state)
+        if len(state) < 40 or len(state) != 40 + int.from_bytes(state[32:40], 'big') % 64:
+            raise ValueError("invalid SM3 midstate")
+        h = SM3(None)
+        h._V = SM3._bytes_to_words(state[:32])
+        h._length = int.from_bytes(state[32:40], 'big')
+        h._m = bytearray(state[40:])
+        return h
+
     def hexdigest(self):
         """Return the digest value as a string of hexadecimal digits.
         """
         return self.digest().hex()
 
     @staticmethod
-    def _one_block(V, B):
+    def _one_block(V, B, W=None):
         """Perform the one block compress function.
 
+        Same result as `_CF(V, *_ME(B))`, with the constants `T_j <<< j`
+        taken from a table, the rounds split into 0~15 and 16~63 with the
+        boolean functions inlined, and W' computed on the fly.
+
         Args:
             V (list): 8-word list
             B (bytes): (512-bit bytes) block
+            W (list, optional): 68-word buffer for the message expansion.
+                Defaults to a new one.
 
         Returns:
             list: 8-word list after compressing
         """
-        W, WW = SM3._ME(B)
-        return SM3._CF(V, W, WW)
+        if W is None:
+            W = [0] * 68
+        W[0:16] = struct.unpack(">16I", B)
+        # bits pushed beyond 32 by a rotation are only ever xored or added upwards,
+        # one mask at the end of each expression drops them
+        for j in range(16, 68):
+            x = W[j-3]
+            x = (W[j-16] ^ W[j-9] ^ (x << 15) ^ (x >> 17)) & 0xFFFFFFFF
+            y = W[j-13]
+            W[j] = (x ^ (x << 15) ^ (x >> 17) ^ (x << 23) ^ (x >> 9) ^ (y << 7) ^ (y >> 25) ^ W[j-6]) & 0xFFFFFFFF
+        T = SM3._T_rol
+        A, B, C, D, E, F, G, H = V
+        for j in range(16):
+            A12 = (A << 12) | (A >> 20)
+            SS1 = (A12 + E + T[j]) & 0xFFFFFFFF
+            SS1 = (SS1 << 7) | (SS1 >> 25)
+            TT1 = ((A ^ B ^ C) + D + (SS1 ^ A12) + (W[j] ^ W[j+4])) & 0xFFFFFFFF
+            TT2 = ((E ^ F ^ G) + H + SS1 + W[j]) & 0xFFFFFFFF
+            A, B, C, D = TT1, A, ((B << 9) | (B >> 23)) & 0xFFFFFFFF, C
+            E, F, G, H = (TT2 ^ (TT2 << 9) ^ (TT2 >> 23) ^ (TT2 << 17) ^ (TT2 >> 15)) & 0xFFFFFFFF, \
+                E, ((F << 19) | (F >> 13)) & 0xFFFFFFFF, G
+        for j in range(16, 64):
+            A12 = (A << 12) | (A >> 20)
+            SS1 = (A12 + E + T[j]) & 0xFFFFFFFF
+            SS1 = (SS1 << 7) | (SS1 >> 25)
+            TT1 = (((A & B) | (C & (A | B))) + D + (SS1 ^ A12) + (W[j] ^ W[j+4])) & 0xFFFFFFFF
+            TT2 = ((G ^ (E & (F ^ G))) + H + SS1 + W[j]) & 0xFFFFFFFF
+            A, B, C, D = TT1, A, ((B << 9) | (B >> 23)) & 0xFFFFFFFF, C
+            E, F, G, H = (TT2 ^ (TT2 << 9) ^ (TT2 >> 23) ^ (TT2 << 17) ^ (TT2 >> 15)) & 0xFFFFFFFF, \
+                E, ((F << 19) | (F >> 13)) & 0xFFFFFFFF, G
+        return [A^V[0], B^V[1], C^V[2], D^V[3], E^V[4], F^V[5], G^V[6], H^V[7]]
 
     @staticmethod
     def _ME(B):
@@ -232,6 +325,15 @@ class SM3():
         0xa96f30bc, 0x163138aa, 0xe38dee4d, 0xb0fb0e4e
     ]
 
+    # hashlib-compatible attributes
+    name = "sm3"
+    digest_size = 32
+    block_size = 64
+
+
+# T_j <<< (j mod 32) of every round, for `SM3._one_block`
+SM3._T_rol = [SM3._rol(SM3._T(j), j % 32) for j in range(64)]
+
 
 def test1():
     print(f"SM3(b'abc'): {SM3(b'abc').hexdigest()}")
@@ -7,22 +7,40 @@ SM4 Symmetric Cipher Implementation.
 
 # Reference: http://www.gmbz.org.cn/main/viewfile/20180108015408199368.html
 
+from Utility import key_schedule_cache
+import struct
+
+try:
+    import numpy as np  # optional, accelerates `encrypt_blocks` / `decrypt_blocks`
+except ImportError:
+    np = None
+
 __all__ = [
     'SM4'
 ]
 
 class SM4():
-    def __init__(self, key):
+    def __init__(self, key, engine=None):
         """Initialize the 32 round keys, given a 16-byte master key.
 
         Args:
             key (bytes): 16-byte master key.
+            engine (str, optional): round engine, "table" (S-box and L
+                merged into four 256-entry tables) or "reference" (the
+                functions T, r and L as specified). Defaults to
+                `SM4.default_engine`.
 
         Raises:
             TypeError: key is not a bytes-like object
-            ValueError: length of key is not 16
+            ValueError: length of key is not 16, or the engine is unknown
         """
-        self.rks = SM4._key_expansion(key)
+        engine = SM4.default_engine if engine is None else engine
+        if engine not in SM4.engines:
+            raise ValueError(f"engine must be one of {SM4.engines}, not {engine!r}")
+        self.engine = engine
+        # expanded once per key, see `Utility.KeyScheduleCache`; the reversed
+        # round keys of decryption are cached too, so that eviction wipes both
+        self.rks, self._drks = key_schedule_cache.get("SM4", key, lambda: SM4._schedule(key))
 
     def encrypt(self, msg):
         """Encryption of SM4 cipher, (16 bytes) msg => (16 bytes) cipher.
@@ -54,12 +72,70 @@ class SM4():
         """
         return self._encrypt(cipher, enc=False)
 
+    def encrypt_blocks(self, buf):
+        """Encryption of a buffer of whole 16-byte blocks, as used by `AES_modes`.
+
+        Args:
+            buf (bytes): bytes-like object, a multiple of 16 bytes in length
+
+        Raises:
+            ValueError: length of buf is not a multiple of 16.
+
+        Returns:
+            bytearray: the blocks after encryption
+        """
+        return self._crypt_blocks(buf, self.rks)
+
+    def decrypt_blocks(self, buf):
+        """Decryption of a buffer of whole 16-byte blocks, as used by `AES_modes`.
+
+        Args:
+            buf (bytes): bytes-like object, a multiple of 16 bytes in length
+
+        Raises:
+            ValueError: length of buf is not a multiple of 16.
+
+        Returns:
+            bytearray: the blocks after decryption
+        """
+        return self._crypt_blocks(buf, self._drks)
+
+    def _crypt_blocks(self, buf, rks):
+        buf = memoryview(buf).cast('B')
+        if len(buf) % 16 != 0:
+            raise ValueError(f"the length must be a multiple of 16, not '{len(buf)}'")
+        out = bytearray(len(buf))
+        if self.engine != "table":
+            enc = rks is self.rks
+            for i in range(0, len(buf), 16):
+                out[i:i+16] = self._encrypt(bytes(buf[i:i+16]), enc)
+            return out
+        if np is not None and len(buf) >= 16*SM4.numpy_threshold:
+            return SM4._crypt_blocks_numpy(buf, rks)
+        # `_crypt_table` inlined, the blocks unpacked and packed in place
+        T0, T1, T2, T3 = SM4._Ttab
+        pack_into = struct.pack_into
+        for j, (x0, x1, x2, x3) in enumerate(struct.iter_unpack(">4I", buf)):
+            for i in range(0, 32, 4):
+                t = x1 ^ x2 ^ x3 ^ rks[i]
+                x0 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+                t = x2 ^ x3 ^ x0 ^ rks[i+1]
+                x1 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+                t = x3 ^ x0 ^ x1 ^ rks[i+2]
+                x2 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+                t = x0 ^ x1 ^ x2 ^ rks[i+3]
+                x3 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+            pack_into(">4I", out, 16*j, x3, x2, x1, x0)
+        return out
+
     def _encrypt(self, msg, enc=True):
         # basic check
         if not isinstance(msg, (bytes, bytearray)):
             raise TypeError(f"a bytes-like object is required, not '{type(msg)}'")
         if len(msg) != 16:
             raise ValueError(f"the length must be 16, not '{len(msg)}'")
+        if self.engine == "table":
+            return SM4._crypt_table(msg, self.rks if enc else self._drks)
         # X: list that represents all the 36 intermediate state words
         X = SM4._bytes_to_words(msg) + [0]*32
         for i in range(32):
@@ -70,6 +146,70 @@ class SM4():
         # last 4 words is the final result
         return SM4._words_to_bytes(X[-1:-5:-1])
 
+    @staticmethod
+    def _crypt_table(msg, rks):
+        """The 32 rounds with the table-driven T, four rounds per iteration.
+
+        `_Ttab[i][x]` is L applied to the S-box output of byte x in the
+        i-th byte position, so T(x) is four lookups and three xors.
+
+        Args:
+            msg (bytes): 16-byte block
+            rks (list): round keys, reversed for decryption
+
+        Returns:
+            bytes: the output block
+        """
+        T0, T1, T2, T3 = SM4._Ttab
+        x0, x1, x2, x3 = struct.unpack(">4I", msg)
+        for i in range(0, 32, 4):
+            t = x1 ^ x2 ^ x3 ^ rks[i]
+            x0 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+            t = x2 ^ x3 ^ x0 ^ rks[i+1]
+            x1 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+            t = x3 ^ x0 ^ x1 ^ rks[i+2]
+            x2 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+            t = x0 ^ x1 ^ x2 ^ rks[i+3]
+            x3 ^= T0[t >> 24] ^ T1[(t >> 16) & 0xFF] ^ T2[(t >> 8) & 0xFF] ^ T3[t & 0xFF]
+        # reverse the last 4 words
+        return struct.pack(">4I", x3, x2, x1, x0)
+
+    @staticmethod
+    def _crypt_blocks_numpy(buf, rks):
+        """The 32 rounds over NumPy uint32 arrays, one lane per block.
+
+        The S-box is a single lookup over the bytes of all the words and L
+        is done with shifts, so a round is a few dozen array operations
+        whatever the number of blocks.
+
+        Args:
+            buf (memoryview): 16*n bytes
+            rks (list): round keys, reversed for decryption
+
+        Returns:
+            bytearray: the output blocks
+        """
+        box = SM4._np_SBOX
+        s = np.frombuffer(buf, dtype='>u4').reshape(-1, 4).astype(np.uint32)
+        X = [s[:, 0].copy(), s[:, 1].copy(), s[:, 2].copy(), s[:, 3].copy()]
+        for i in range(32):
+            t = X[(i+1) % 4] ^ X[(i+2) % 4] ^ X[(i+3) % 4] ^ np.uint32(rks[i])
+            # tau on each byte, whatever the byte order of the words
+            b = box[t.view(np.uint8)].view(np.uint32)
+            X[i % 4] ^= b ^ (b << 2 | b >> 30) ^ (b << 10 | b >> 22) ^ (b << 18 | b >> 14) ^ (b << 24 | b >> 8)
+        # reverse the last 4 words
+        return bytearray(np.stack(X[::-1], axis=1).astype('>u4').tobytes())
+
+
+    @staticmethod
+    def _schedule(key):
+        """The round keys of encryption and of decryption, as cached.
+
+        Returns:
+            list: the 32 round keys, and the same in reverse order
+        """
+        rks = SM4._key_expansion(key)
+        return [rks, rks[::-1]]
 
     @staticmethod
     def _key_expansion(key):
@@ -201,6 +341,14 @@ class SM4():
         """
         return b"".join(int.to_bytes(i, 4, 'big') for i in w)
 
+    # constant
+    block_size = 16
+    engines = ("table", "reference")
+    default_engine = "table"
+    # minimum number of blocks for `encrypt_blocks` / `decrypt_blocks` to use NumPy
+    numpy_threshold = 64
+
+    # table
     _SBOX = [
         0xd6, 0x90, 0xe9, 0xfe, 0xcc, 0xe1, 0x3d, 0xb7,
         0x16, 0xb6, 0x14, 0xc2, 0x28, 0xfb, 0x2c,  0x5,
@@ -250,6 +398,12 @@ class SM4():
     ]
 
 
+# T-tables: the S-box followed by L, for the byte in each of the four positions
+SM4._Ttab = [[SM4._L(SM4._SBOX[x] << (24 - 8*i)) for x in range(256)] for i in range(4)]
+if np is not None:
+    SM4._np_SBOX = np.array(SM4._SBOX, dtype=np.uint8)
+
+
 def test1():
     msg = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
     key = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
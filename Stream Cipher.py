@@ -23,11 +23,15 @@ def stream_enc(pt, k):
         bits = Utility.str2bits(pt)
     else:
         raise TypeError("plaintext must be type str or bytes")
-    # xor
-    c = ""
-    for i, v in enumerate(bits):
-        c += str(int(v) ^ k[i % len(k)])
-    return Utility.bits2bytes(c)
+    n = len(bits)
+    if n == 0:
+        return b""
+    # xor with the key repeated over all the bits, as integers
+    L = len(k)
+    reps = -(-n // L)
+    stream = Utility.Block2Int(k) * (((1 << (L * reps)) - 1) // ((1 << L) - 1)) >> (L * reps - n)
+    c = int(bits, 2) ^ stream
+    return Utility.bits2bytes(format(c, '0%db' % n))
 
 def stream_dec(ct, k):
     '''
@@ -53,22 +57,18 @@ def lfsr_f(start, taps, l=1<<10):
     :return: pseudorandom 0,1 character list
     :rtype: list
     '''
-    # only '1' in taps works, get the index of all '1' in taps
-    index = []
-    for i in range(len(taps)):
-        if taps[i]:
-            index.append(i)
-    pre = start
+    # the state and the taps as integers, the first element is the most significant bit
+    n = len(start)
+    pre = Utility.Block2Int(start)
+    mask = Utility.Block2Int([1 if t else 0 for t in taps[:n]]) << max(0, n - len(taps))
     key = []
     while l > 0:
         l -= 1
-        # calculate output
-        output = 0
-        for i in index:
-            output ^= pre[i]
+        # calculate output: parity of the tapped bits
+        output = bin(pre & mask).count('1') & 1
         key.append(output)
         # left shift and feedback
-        pre = [output] + pre[:-1]
+        pre = (output << (n - 1)) | (pre >> 1)
     return key
 
 
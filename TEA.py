@@ -9,6 +9,9 @@ Implementation of TEA, a Tiny Encryption Algorithm.
 
 
 class TEA():
+    # 64-bit blocks, for the modes in `AES_modes`
+    block_size = 8
+
     def __init__(self, k):
         if not isinstance(k, bytes) and not isinstance(k, bytearray):
             raise TypeError("Type of key must be bytes/bytearray.")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""
+Merkle tree (chunked) hashing over SHA1 and SM3, with manifests.
+
+The input is split into fixed-size leaves. The tree follows RFC 6962:
+a leaf hashes as H(0x00 || leaf), a parent as H(0x01 || left || right),
+the left subtree holding the largest power of two of leaves below the
+total, and an empty input hashes as H(""). The leaves of a file are
+hashed by a process pool, and a manifest keeps their digests so one
+chunk can be checked again without rehashing the whole file.
+"""
+
+# Reference: https://tools.ietf.org/html/rfc6962#section-2.1
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import mmap
+import os
+
+from SHA1 import SHA1
+from SM3 import SM3
+
+__all__ = [
+    'Manifest', 'tree_hash', 'hash_file', 'verify_file', 'verify_leaf'
+]
+
+HASHES = {"sha1": SHA1, "sm3": SM3}
+
+
+def leaf_hash(hash_cls, data):
+    """Digest of a leaf, H(0x00 || data).
+    """
+    h = hash_cls(b"\x00")
+    h.update(data)
+    return h.digest()
+
+
+def parent_hash(hash_cls, left, right):
+    """Digest of an inner node, H(0x01 || left || right).
+    """
+    return hash_cls(b"\x01" + left + right).digest()
+
+
+def root_hash(hash_cls, leaves):
+    """Merkle tree root of the leaf digests.
+
+    Args:
+        hash_cls (class): SHA1 or SM3
+        leaves (list): leaf digests
+
+    Returns:
+        bytes: the root digest
+    """
+    if not leaves:
+        return hash_cls(b"").digest()
+    level = list(leaves)
+    # pairing from the left and carrying an odd node up a level builds the
+    # same tree as splitting at the largest power of two
+    while len(level) > 1:
+        nxt = [parent_hash(hash_cls, level[i], level[i+1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+class Manifest(object):
+    def __init__(self, name, leaf_size, size, leaves):
+        """The leaf digests of an input, along with how it was split.
+
+        Args:
+            name (str): "sha1" or "sm3"
+            leaf_size (int): bytes per leaf
+            size (int): total length of the input
+            leaves (list): leaf digests
+        """
+        if name not in HASHES:
+            raise ValueError(f"unsupported hash: {name}")
+        self.name = name
+        self.leaf_size = leaf_size
+        self.size = size
+        self.leaves = list(leaves)
+        if len(self.leaves) != -(-size // leaf_size):
+            raise ValueError("the number of leaves does not match the size")
+
+    @property
+    def root(self):
+        """Root digest, computed from the leaf digests.
+        """
+        return root_hash(HASHES[self.name], self.leaves)
+
+    def to_json(self):
+        """Serialize the manifest.
+
+        Returns:
+            str: JSON text, the digests in hexadecimal
+        """
+        return json.dumps({
+            "hash": self.name,
+            "leaf_size": self.leaf_size,
+            "size": self.size,
+            "root": self.root.hex(),
+            "leaves": [d.hex() for d in self.leaves],
+        }, indent=1)
+
+    @staticmethod
+    def from_json(text):
+        """Restore a manifest from `to_json()`.
+
+        Raises:
+            ValueError: the recorded root does not match the leaves
+        """
+        obj = json.loads(text)
+        manifest = Manifest(obj["hash"], obj["leaf_size"], obj["size"], [bytes.fromhex(d) for d in obj["leaves"]])
+        if manifest.root.hex() != obj["root"]:
+            raise ValueError("the manifest root does not match its leaves")
+        return manifest
+
+    def save(self, path):
+        """Write the manifest to a file as JSON.
+        """
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    @staticmethod
+    def load(path):
+        """Read a manifest written by `save()`.
+        """
+        with open(path) as f:
+            return Manifest.from_json(f.read())
+
+
+def tree_hash(data, hash_cls=SM3, leaf_size=1 << 20):
+    """Manifest of an in-memory input, hashed in this process.
+
+    Args:
+        data (bytes): bytes-like input
+        hash_cls (class, optional): SHA1 or SM3. Defaults to SM3.
+        leaf_size (int, optional): bytes per leaf. Defaults to 1 MiB.
+
+    Returns:
+        Manifest: the manifest, `.root` is the tree hash
+    """
+    with memoryview(data) as view, view.cast('B') as data:
+        leaves = [leaf_hash(hash_cls, data[i:i+leaf_size]) for i in range(0, len(data), leaf_size)]
+        return Manifest(hash_cls.name, leaf_size, len(data), leaves)
+
+
+def hash_file(path, hash_cls=SM3, leaf_size=1 << 20, workers=None, batch=16):
+    """Manifest of a file, the leaves hashed by a process pool.
+
+    Args:
+        path (str): the file
+        hash_cls (class, optional): SHA1 or SM3. Defaults to SM3.
+        leaf_size (int, optional): bytes per leaf. Defaults to 1 MiB.
+        workers (int, optional): number of worker processes, None for
+            `os.cpu_count()`, 1 to hash in this process. Defaults to None.
+        batch (int, optional): leaves per task. Defaults to 16.
+
+    Returns:
+        Manifest: the manifest, `.root` is the tree hash
+    """
+    size = os.path.getsize(path)
+    n = -(-size // leaf_size)
+    tasks = [(hash_cls.name, path, leaf_size, first, min(batch, n - first)) for first in range(0, n, batch)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [_leaves_task(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_leaves_task, *zip(*tasks)))
+    return Manifest(hash_cls.name, leaf_size, size, [d for r in results for d in r])
+
+
+def verify_leaf(path, manifest, i):
+    """Check the i-th leaf of a file against the manifest, reading only that leaf.
+
+    Returns:
+        bool: whether the leaf matches
+    """
+    if os.path.getsize(path) != manifest.size:
+        return False
+    return _leaves_task(manifest.name, path, manifest.leaf_size, i, 1)[0] == manifest.leaves[i]
+
+
+def verify_file(path, manifest, workers=None):
+    """Rehash a file and compare it with the manifest leaf by leaf.
+
+    Returns:
+        list: indices of the leaves that do not match, all of them if the
+            size differs
+    """
+    if os.path.getsize(path) != manifest.size:
+        return list(range(len(manifest.leaves)))
+    current = hash_file(path, HASHES[manifest.name], manifest.leaf_size, workers)
+    return [i for i, (a, b) in enumerate(zip(current.leaves, manifest.leaves)) if a != b]
+
+
+def _leaves_task(name, path, leaf_size, first, count):
+    """Digests of `count` leaves from the `first`, read from a memory map of the file.
+    """
+    hash_cls = HASHES[name]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            with memoryview(m) as view:
+                return [leaf_hash(hash_cls, view[i*leaf_size:(i+1)*leaf_size]) for i in range(first, first + count)]
+
+
+def test():
+    import tempfile
+    data = os.urandom(5 * 4096 + 123)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "data")
+        with open(path, "wb") as f:
+            f.write(data)
+        manifest = hash_file(path, SM3, leaf_size=4096, workers=2)
+        print(f"root: {manifest.root.hex()}")
+        print(f"same as in memory: {manifest.root == tree_hash(data, SM3, 4096).root}")
+        with open(path, "r+b") as f:
+            f.seek(3 * 4096)
+            f.write(b"\xff")
+        print(f"corrupted leaves: {verify_file(path, manifest, workers=1)}")
+        print(f"leaf 3 ok: {verify_leaf(path, manifest, 3)}, leaf 4 ok: {verify_leaf(path, manifest, 4)}")
+
+
+if __name__ == "__main__":
+    test()
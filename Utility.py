@@ -5,70 +5,92 @@
 Some utility functions for several cipher algorithms implementation.
 '''
 
+from collections import OrderedDict
+import hashlib
+import sys
+import threading
+
+try:
+    import numpy as np  # optional, accelerates the batch permutations
+except ImportError:
+    np = None
+
+# bit list <-> '0'/'1' digits, for going through `int(..., 2)` and `format`
+_BITS2DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_DIGITS2BITS = bytes.maketrans(b'01', b'\x00\x01')
+
 def BlockXor(bx, by):
     '''
     Xor each of the element in the two blocks
     '''
-    result = []
-    for i in range(len(bx)):
-        result.append(bx[i] ^ by[i])
-    return result # ok
+    return [x ^ y for x, y in zip(bx, by)] # ok
+
+def Block2Int(b):
+    '''
+    Convert bit block to an integer, the first bit is the most significant
+
+    :param list b: 0,1 integers
+    :rtype: int
+    '''
+    return int(bytes(b).translate(_BITS2DIGITS), 2) if b else 0
+
+def Int2Block(x, n):
+    '''
+    Convert an n-bit integer to bit block
+
+    :param int x: the integer
+    :param int n: length of the block
+    :rtype: list
+    '''
+    return list(format(x, '0%db' % n).encode().translate(_DIGITS2BITS)) if n else []
 
 def String2Block(s):
     '''
     Convert string to bit block
     '''
-    result = []
-    for i in s:
-        for j in range(8):
-            result.append(ord(i) >> (7-j) & 1) # Little-Endian ???
-    return result  # ok
+    return Bytes2Block(bytes(ord(i) & 0xFF for i in s)) # Little-Endian ???
 
 def Bytes2Block(b):
     '''
     Convert bytes to bit block
     '''
-    result = []
-    for i in b:
-        for j in range(8):
-            result.append(i >> (7 - j) & 1)
-    return result # ok
+    return Int2Block(int.from_bytes(b, 'big'), 8 * len(b)) # ok
 
 def Block2String(b):
     '''
     Convert bit block to string
     '''
-    result = ""
-    for i in range(8):
-        dec = 0 # get the decimal of 8 bits
-        for j in range(8):
-            dec += b[i * 8 + j] << (7 - j)
-        result += chr(dec)
-    return result  # ok
+    return Block2Bytes(b).decode('latin-1') # ok
 
 def Block2Bytes(b):
     '''
-    Convert bit block to bytes
+    Convert bit block to bytes, trailing bits short of a byte are dropped
     '''
-    result = b""
-    for i in range(8):
-        dec = 0
-        for j in range(8):
-            dec += b[i * 8 + j] << (7 - j)
-        result += bytes([dec])
-    return result # ok
+    return (Block2Int(b) >> (len(b) % 8)).to_bytes(len(b) // 8, 'big') # ok
 
 def Permute(block, p):
     '''
     Do the general permutation
     '''
-    result = []
     try:
-        for i in range(len(p)):
-            result.append(block[p[i]-1])
+        return [block[i-1] for i in p]
     except IndexError:
-        print("Permutation is out of index of the block")
-    return result # ok
+        raise IndexError("Permutation is out of index of the block") from None # ok
+
+def PermuteInt(x, table, n):
+    '''
+    Do the general permutation on an integer.
+
+    :param int x: n-bit input
+    :param list table: 1-based bit positions, counted from the most significant bit
+    :param int n: bit length of the input
+    :return: len(table)-bit output
+    :rtype: int
+    '''
+    result = 0
+    for t in table:
+        result = (result << 1) | ((x >> (n - t)) & 1)
+    return result
 
 def bytes2bits(b):
     '''
@@ -77,7 +99,7 @@ def bytes2bits(b):
     :param bytes b
     :rtype: str
     '''
-    return ''.join(bin(i)[2:].rjust(8, '0') for i in b) # ok
+    return format(int.from_bytes(b, 'big'), '0%db' % (8 * len(b))) if b else '' # ok
 
 def str2bits(s):
     '''
@@ -86,7 +108,11 @@ def str2bits(s):
     :param str s
     :rtype: str
     '''
-    return ''.join(bin(ord(i))[2:].rjust(8, '0') for i in s) # ok
+    try:
+        return bytes2bits(s.encode('latin-1'))
+    except UnicodeEncodeError:
+        # characters beyond a byte take more than 8 bits
+        return ''.join(bin(ord(i))[2:].rjust(8, '0') for i in s) # ok
 
 def bits2bytes(b):
     '''
@@ -95,6 +121,9 @@ def bits2bytes(b):
     :param str b: 0,1 character sequences
     :rtype: bytes
     '''
+    if len(b) % 8 == 0:
+        return int(b, 2).to_bytes(len(b) // 8, 'big') if b else b''
+    # the last character is made of the remaining bits
     return b''.join(bytes([int(b[i: i + 8], 2)]) for i in range(0, len(b), 8)) # ok
 
 def bits2str(b):
@@ -104,4 +133,385 @@ def bits2str(b):
     :param str b: 0,1 character sequences
     :rtype: str
     '''
+    if len(b) % 8 == 0:
+        return bits2bytes(b).decode('latin-1')
     return ''.join(chr(int(b[i:i+8],2)) for i in range(0,len(b),8)) # ok
+
+
+def Bytes2BlockArray(data, block_size):
+    '''
+    Unpack many blocks to a NumPy array of bits (needs NumPy)
+
+    :param bytes-like data: concatenated blocks
+    :param int block_size: bytes per block
+    :return: uint8 array of shape (number of blocks, 8 * block_size)
+    '''
+    if np is None:
+        raise ImportError("NumPy is required for the batch conversions")
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8).reshape(-1, block_size), axis=1)
+
+def BlockArray2Bytes(bits):
+    '''
+    Pack a NumPy array of bits, one block per row, back to bytes (needs NumPy);
+    rows short of a byte are padded with zero bits at the end
+
+    :param bits: 0,1 array of shape (number of blocks, bits per block)
+    :rtype: bytes
+    '''
+    if np is None:
+        raise ImportError("NumPy is required for the batch conversions")
+    return np.packbits(bits, axis=1).tobytes()
+
+
+class BytePermutation(object):
+    '''
+    A permutation table(as `Permute` takes) precompiled into byte-indexed lookup tables:
+    the output is the xor of one table entry per input byte, n/8 lookups instead of
+    one step per output bit.
+    '''
+    def __init__(self, table, n):
+        '''
+        :param list table: 1-based bit positions, counted from the most significant bit
+        :param int n: bit length of the input, a multiple of 8
+        :raises ValueError: if n is not a multiple of 8 or the table is out of range
+        '''
+        if n % 8 != 0:
+            raise ValueError("input length must be a multiple of 8")
+        if not all(1 <= t <= n for t in table):
+            raise ValueError("Permutation is out of index of the block")
+        self.table = list(table)
+        self.n = n
+        self.m = len(table)
+        self.tables = [[PermuteInt(b << (n - 8 - 8*j), table, n) for b in range(256)] for j in range(n // 8)]
+
+    def __call__(self, x):
+        '''
+        Permute the n-bit integer x
+
+        :rtype: int
+        '''
+        result = 0
+        for t, b in zip(self.tables, x.to_bytes(self.n // 8, 'big')):
+            result ^= t[b]
+        return result
+
+    def block(self, b):
+        '''
+        Permute a bit block, as `Permute(b, table)`
+
+        :rtype: list
+        '''
+        return Int2Block(self(Block2Int(b)), self.m)
+
+    def bytes(self, b):
+        '''
+        Permute n/8 bytes; an output short of a byte is padded with zero bits at the end
+
+        :rtype: bytes
+        '''
+        m = self.m + (-self.m) % 8
+        return (self(int.from_bytes(b, 'big')) << (m - self.m)).to_bytes(m // 8, 'big')
+
+    def apply_blocks(self, data):
+        '''
+        Permute many concatenated n-bit blocks, with NumPy `unpackbits`/`packbits` if available
+
+        :param bytes-like data: multiple of n/8 bytes in length
+        :return: the outputs concatenated, each padded as in `bytes`
+        :rtype: bytes
+        '''
+        k = self.n // 8
+        if len(data) % k != 0:
+            raise ValueError("The length of data must be the mutiple of %d" % k)
+        if np is not None:
+            index = np.array(self.table) - 1
+            return BlockArray2Bytes(Bytes2BlockArray(data, k)[:, index])
+        data = memoryview(data).cast('B')
+        return b''.join([self.bytes(data[i:i+k]) for i in range(0, len(data), k)])
+
+
+class BitPermutation(object):
+    '''
+    A permutation table(as `Permute` takes) planned once into shift-and-mask operations on integers.
+
+    Two plans are considered and the one with fewer operations is kept:
+    - shift groups: output bits that move by the same distance share one mask and one shift,
+      this works for any table, including the expansions and selections(E, PC-1, PC-2);
+    - a Benes network of delta swaps, for a table that is a bijection,
+      at most 2*log2(n) - 1 stages of six operations each.
+    The same operations apply to NumPy uint64 arrays, one block per element.
+    '''
+    def __init__(self, table, n):
+        '''
+        :param list table: 1-based bit positions, counted from the most significant bit
+        :param int n: bit length of the input
+        :raises ValueError: if the table is out of range
+        '''
+        if not all(1 <= t <= n for t in table):
+            raise ValueError("Permutation is out of index of the block")
+        self.table = list(table)
+        self.n = n
+        self.m = len(table)
+        self.shifts = self._plan_shifts()
+        self.swaps = self._plan_swaps() if sorted(table) == list(range(1, n + 1)) else None
+        if self.swaps is not None and 6 * len(self.swaps) < self.cost(self.shifts):
+            self.plan = "swaps"
+        else:
+            self.plan = "shifts"
+
+    @staticmethod
+    def cost(shifts):
+        '''
+        Number of integer operations of a shift-group plan
+        '''
+        return sum(2 if d == 0 else 3 for d, _ in shifts) - 1
+
+    def __call__(self, x):
+        '''
+        Permute the n-bit integer x
+
+        :rtype: int
+        '''
+        if self.plan == "swaps":
+            for d, mask in self.swaps:
+                t = ((x >> d) ^ x) & mask
+                x ^= t ^ (t << d)
+            return x
+        result = 0
+        for d, mask in self.shifts:
+            if d >= 0:
+                result |= (x & mask) << d
+            else:
+                result |= (x & mask) >> -d
+        return result
+
+    def block(self, b):
+        '''
+        Permute a bit block, as `Permute(b, table)`
+
+        :rtype: list
+        '''
+        return Int2Block(self(Block2Int(b)), self.m)
+
+    def apply_array(self, a):
+        '''
+        Permute every element of a NumPy array (needs NumPy, n and the output at most 64 bits)
+
+        :param a: array of n-bit blocks
+        :return: uint64 array of the outputs
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for the batch permutations")
+        if self.n > 64 or self.m > 64:
+            raise ValueError("NumPy lanes hold at most 64 bits")
+        x = np.asarray(a, dtype=np.uint64)
+        if self.plan == "swaps":
+            x = x.copy()
+            for d, mask in self.swaps:
+                d, mask = np.uint64(d), np.uint64(mask)
+                t = ((x >> d) ^ x) & mask
+                x ^= t ^ (t << d)
+            return x
+        result = np.zeros_like(x)
+        for d, mask in self.shifts:
+            if d >= 0:
+                result |= (x & np.uint64(mask)) << np.uint64(d)
+            else:
+                result |= (x & np.uint64(mask)) >> np.uint64(-d)
+        return result
+
+    def _plan_shifts(self):
+        '''
+        Group the output bits by the distance they move, as (distance, mask of the input bits)
+        '''
+        groups = {}
+        for i, t in enumerate(self.table):
+            # bit positions counted from the least significant bit
+            src, dst = self.n - t, self.m - 1 - i
+            groups[dst - src] = groups.get(dst - src, 0) | (1 << src)
+        return sorted(groups.items())
+
+    def _plan_swaps(self):
+        '''
+        Route the bijection through a Benes network, as (delta, mask) delta swaps;
+        stages with an empty mask are left out
+        '''
+        N = 1
+        while N < self.n:
+            N <<= 1
+        # out[q] = in[src[q]] on bit positions from the least significant bit,
+        # padded to a power of 2 with fixed points
+        src = list(range(N))
+        for i, t in enumerate(self.table):
+            src[self.n - 1 - i] = self.n - t
+        front, back = {}, {}
+        self._route(src, 0, front, back)
+        deltas = sorted(front, reverse=True)
+        stages = [(d, front[d]) for d in deltas] + [(d, back[d]) for d in reversed(deltas) if d in back]
+        return [(d, mask) for d, mask in stages if mask]
+
+    @staticmethod
+    def _route(src, offset, front, back):
+        '''
+        Split the permutation `src` of the positions offset ~ offset+len(src)-1 over the
+        first and last stage of delta len(src)/2 and two subnetworks of half the size
+        '''
+        size = len(src)
+        h = size >> 1
+        if h == 0:
+            return
+        if h == 1:
+            # the middle stage, a single swap
+            if src[0] == 1:
+                front[1] = front.get(1, 0) | (1 << offset)
+            return
+        dst = [0] * size
+        for q, a in enumerate(src):
+            dst[a] = q
+        # subnetwork(0 lower, 1 upper) of each output, chosen pair by pair around the cycles
+        side = [None] * size
+        for start in range(h):
+            if side[start] is not None:
+                continue
+            q, s = start, 0
+            while side[q] is None:
+                side[q], side[q ^ h] = s, 1 - s
+                # the input partner of what q takes goes through the other subnetwork,
+                # and so does the output taking it
+                q = dst[src[q ^ h] ^ h]
+        swap_in = swap_out = 0
+        lower, upper = [0] * h, [0] * h
+        for q in range(size):
+            a = src[q]
+            if side[q] != (a >= h):
+                swap_in |= 1 << (a % h)
+            if side[q] != (q >= h):
+                swap_out |= 1 << (q % h)
+            (upper if side[q] else lower)[q % h] = a % h
+        front[h] = front.get(h, 0) | (swap_in << offset)
+        back[h] = back.get(h, 0) | (swap_out << offset)
+        BitPermutation._route(lower, offset, front, back)
+        BitPermutation._route(upper, offset + h, front, back)
+
+
+class KeyScheduleCache(object):
+    '''
+    Thread-safe LRU cache of expanded key schedules, shared by the cipher constructors
+    so that a key used again and again is expanded only once.
+
+    Entries are looked up by a SHA-256 digest of (name, key), so raw keys are never kept.
+    Schedules(nested lists of ints) are shared by every caller without copying, a hit
+    costs one digest and one dict lookup; callers must never modify them.
+
+    Schedules pushed out by the LRU limits are just dropped. `evict()` and `clear()`
+    zeroize them in place: every live cipher object built from such a key shares the
+    lists and is unusable afterwards(it silently computes with all-zero round keys).
+    '''
+    def __init__(self, max_entries=256, max_bytes=16 << 20):
+        '''
+        :param int max_entries: maximum number of schedules kept, 0 disables the cache
+        :param int max_bytes: approximate memory cap of the cached schedules
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # digest -> (schedule, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, name, key, build):
+        '''
+        Return the schedule of `key`, calling `build()` on a miss
+
+        :param str name: cipher name, e.g. "AES"
+        :param bytes key: the key
+        :param build: function without arguments that expands `key`
+        :return: the schedule, nested lists of ints(never modify it)
+        '''
+        if self.max_entries <= 0 or not isinstance(key, (bytes, bytearray)):
+            # disabled, or a bad key that `build()` is expected to reject
+            return build()
+        digest = self._digest(name, key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        # expand outside the lock, other threads keep using the cache meanwhile
+        schedule = build()
+        size = _sizeof_schedule(schedule)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                # another thread got there first, share its schedule
+                return entry[0]
+            self._entries[digest] = (schedule, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+        return schedule
+
+    def evict(self, name, key):
+        '''
+        Remove the schedule of `key`, if cached, and zeroize it in place;
+        cipher objects still using this key become unusable
+
+        :return: whether it was cached
+        :rtype: bool
+        '''
+        digest = self._digest(name, key)
+        with self._lock:
+            if digest not in self._entries:
+                return False
+            _zeroize_schedule(self._drop(digest))
+            return True
+
+    def clear(self):
+        '''
+        Remove all the cached schedules and zeroize them in place;
+        every cipher object built from a cached key becomes unusable
+        '''
+        with self._lock:
+            while self._entries:
+                _zeroize_schedule(self._drop(next(iter(self._entries))))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, digest):
+        '''
+        Unlink an entry, return its schedule
+        '''
+        schedule, size = self._entries.pop(digest)
+        self._bytes -= size
+        self.evictions += 1
+        return schedule
+
+    @staticmethod
+    def _digest(name, key):
+        return hashlib.sha256(name.encode() + b'\x00' + bytes(key)).digest()
+
+
+def _zeroize_schedule(s):
+    '''
+    Overwrite nested lists of ints with zeros, in place
+    '''
+    for i, v in enumerate(s):
+        if isinstance(v, list):
+            _zeroize_schedule(v)
+        else:
+            s[i] = 0
+
+def _sizeof_schedule(s):
+    '''
+    Approximate memory used by nested lists of ints
+    '''
+    return sys.getsizeof(s) + sum(_sizeof_schedule(i) if isinstance(i, list) else sys.getsizeof(i) for i in s)
+
+
+# the cache shared by AES, SM4 and DES
+key_schedule_cache = KeyScheduleCache()